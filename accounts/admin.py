@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, UserProfile
+from .models import User, UserProfile, OutgoingEmail
 
 
 # Register your models here.
@@ -13,5 +13,11 @@ class CustomUserAdmin(UserAdmin):
     ordering = ('-date_joined',)
 
 
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+
+
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(UserProfile)
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
@@ -1,23 +1,13 @@
 from django.conf import settings
 
-from accounts.models import UserProfile
-from vendor.models import Vendor
-
 
+# Both are resolved lazily by accounts.middleware.vendor_profile_middleware
 def get_vendor(request):
-    try:
-        vendor = Vendor.objects.get(user=request.user)
-    except:
-        vendor = None
-    return dict(vendor=vendor)
+    return dict(vendor=request.vendor)
 
 
 def get_user_profile(request):
-    try:
-        user_profile = UserProfile.objects.get(user=request.user)
-    except:
-        user_profile = None
-    return dict(user_profile=user_profile)
+    return dict(user_profile=request.user_profile)
 
 
 def get_google_api(request):
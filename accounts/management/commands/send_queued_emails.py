@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.utils import deliver_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Deliver the emails queued in the outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4, help='Threads sending in parallel.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep when the outbox is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = deliver_queued_emails(options['batch_size'], options['workers'])
+            if sent:
+                self.stdout.write(f'Sent {sent} email(s).')
+            if not options['loop']:
+                break
+            if sent < options['batch_size']:
+                time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+from django.utils.functional import SimpleLazyObject
+
+from accounts.models import User, UserProfile
+from vendor.models import Vendor
+
+
+def get_request_vendor(request):
+    if not request.user.is_authenticated or request.user.role != User.RESTAURANT:
+        return None
+    return Vendor.objects.select_related('user_profile').filter(user=request.user).first()
+
+
+def get_request_user_profile(request):
+    if not request.user.is_authenticated:
+        return None
+    # A vendor's profile comes with the vendor row
+    if request.vendor:
+        return request.vendor.user_profile
+    return UserProfile.objects.filter(user=request.user).first()
+
+
+def vendor_profile_middleware(get_response):
+    """Resolve request.vendor and request.user_profile on first access, once per request."""
+
+    def middleware(request):
+        request.vendor = SimpleLazyObject(lambda: get_request_vendor(request))
+        request.user_profile = SimpleLazyObject(lambda: get_request_user_profile(request))
+        return get_response(request)
+
+    return middleware
@@ -1,3 +1,70 @@
-from django.test import TestCase
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
 # Create your tests here.
+from accounts.models import OutgoingEmail, User
+from accounts.utils import deliver_queued_emails, queue_email
+from foodOnline.testing import create_user
+from vendor.models import Vendor
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('SMTP server unavailable')
+
+
+class OutgoingEmailTest(TestCase):
+    def test_queued_emails_are_delivered_in_batch(self):
+        for i in range(5):
+            queue_email(f'Order {i}', '<p>Thanks</p>', f'customer{i}@example.com')
+        self.assertEqual(len(mail.outbox), 0)
+
+        call_command('send_queued_emails', batch_size=10, workers=2)
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].content_subtype, 'html')
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count(), 5)
+
+    @override_settings(EMAIL_BACKEND='accounts.tests.FailingEmailBackend')
+    def test_failed_emails_are_retried_with_backoff(self):
+        email = queue_email('Welcome', '<p>Hi</p>', ['customer@example.com'])
+
+        self.assertEqual(deliver_queued_emails(), 0)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('SMTP server unavailable', email.last_error)
+        # Not due again until the backoff has elapsed
+        self.assertEqual(deliver_queued_emails(), 0)
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 1)
+
+
+class RequestVendorTest(TestCase):
+    def vendor_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries if 'FROM "vendor_vendor"' in query['sql']]
+
+    def test_vendor_is_resolved_once_per_request(self):
+        user = create_user('vendor', User.RESTAURANT)
+        vendor = Vendor.objects.create(user=user, user_profile=user.userprofile, vendor_name='Vendor',
+                                       vendor_slug='vendor', vendor_license='vendor/license/license.png')
+        self.client.force_login(user)
+        response, queries = self.vendor_queries(reverse('add_food'))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.context['vendor'], vendor)
+        self.assertEqual(response.context['user_profile'], user.userprofile)
+
+    def test_customers_never_look_up_a_vendor(self):
+        user = create_user('customer', User.CUSTOMER)
+        self.client.force_login(user)
+        response, queries = self.vendor_queries(reverse('customer_profile'))
+        self.assertEqual(queries, [])
+        self.assertEqual(response.context['profile'], user.userprofile)
@@ -1,10 +1,21 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
 from django.template.loader import render_to_string
+from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 
+from accounts.models import OutgoingEmail
+
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_DELAY = 60  # seconds, doubled after every failed attempt
+EMAIL_SENDING_LEASE = 10 * 60  # seconds before an unfinished claim is retried
+
 
 def detectUser(user):
     if user.role == 1:
@@ -18,6 +29,12 @@ def detectUser(user):
         return redirectUrl
 
 
+def queue_email(mail_subject, message, to_email):
+    if isinstance(to_email, str):
+        to_email = [to_email]
+    return OutgoingEmail.objects.create(subject=mail_subject, body=message, to=list(to_email))
+
+
 def send_verification_email(request, user, mail_subject, email_template):
     current_site = get_current_site(request)
     message = render_to_string(email_template, {
@@ -27,18 +44,83 @@ def send_verification_email(request, user, mail_subject, email_template):
         'token': default_token_generator.make_token(user),
     })
     to_email = user.email
-    mail = EmailMessage(mail_subject, message, to=[to_email])
-    mail.content_subtype = "html"
-    mail.send()
+    queue_email(mail_subject, message, to_email)
 
 
 def send_notification(mail_subject, mail_template, context):
     message = render_to_string(mail_template, context)
-    if isinstance(context['to_email'], str):
-        to_email = []
-        to_email.append(context['to_email'])
-    else:
+    queue_email(mail_subject, message, context['to_email'])
+
+
+def send_notifications(notifications):
+    """Queue a batch of (mail_subject, mail_template, context) notifications with a single INSERT."""
+    emails = []
+    for mail_subject, mail_template, context in notifications:
         to_email = context['to_email']
-    mail = EmailMessage(mail_subject, message, to=to_email)
-    mail.content_subtype = "html"
-    mail.send()
+        if isinstance(to_email, str):
+            to_email = [to_email]
+        emails.append(OutgoingEmail(subject=mail_subject, body=render_to_string(mail_template, context),
+                                    to=list(to_email)))
+    return OutgoingEmail.objects.bulk_create(emails)
+
+
+def claim_queued_emails(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[OutgoingEmail.PENDING, OutgoingEmail.SENDING], next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            status=OutgoingEmail.SENDING,
+            next_attempt_at=now + datetime.timedelta(seconds=EMAIL_SENDING_LEASE),
+        )
+    return emails
+
+
+def _deliver(emails):
+    # One SMTP connection per chunk; the database is left to the calling thread
+    sent, failed = [], []
+    connection = get_connection()
+    try:
+        connection.open()
+        for email in emails:
+            mail = EmailMessage(email.subject, email.body, to=email.to, connection=connection)
+            mail.content_subtype = email.content_subtype
+            try:
+                mail.send()
+                sent.append(email)
+            except Exception as e:
+                failed.append((email, str(e)))
+    except Exception as e:
+        failed.extend((email, str(e)) for email in emails if email not in sent)
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def deliver_queued_emails(batch_size=100, workers=4):
+    """Send one batch from the outbox and return the number of delivered messages."""
+    emails = claim_queued_emails(batch_size)
+    if not emails:
+        return 0
+    chunk_size = -(-len(emails) // workers)
+    chunks = [emails[i:i + chunk_size] for i in range(0, len(emails), chunk_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_deliver, chunks))
+
+    now = timezone.now()
+    sent = [email.pk for chunk_sent, _ in results for email in chunk_sent]
+    OutgoingEmail.objects.filter(pk__in=sent).update(status=OutgoingEmail.SENT, sent_at=now, last_error='')
+    for _, chunk_failed in results:
+        for email, error in chunk_failed:
+            attempts = email.attempts + 1
+            if attempts >= EMAIL_MAX_ATTEMPTS:
+                status, next_attempt_at = OutgoingEmail.FAILED, now
+            else:
+                status = OutgoingEmail.PENDING
+                next_attempt_at = now + datetime.timedelta(seconds=EMAIL_RETRY_DELAY * 2 ** (attempts - 1))
+            OutgoingEmail.objects.filter(pk=email.pk).update(
+                status=status, attempts=attempts, last_error=error, next_attempt_at=next_attempt_at)
+    return len(sent)
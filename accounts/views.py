@@ -1,5 +1,3 @@
-import datetime
-
 from django.contrib import messages, auth
 from django.contrib.auth import authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -9,14 +7,15 @@ from django.shortcuts import render, redirect
 
 # Create your views here.
 from django.template.defaultfilters import slugify
+from django.utils import timezone
 from django.utils.http import urlsafe_base64_decode
 
 from accounts.forms import UserForm
 from accounts.models import User
 from accounts.utils import detectUser, send_verification_email
-from orders.models import Order
+from marketplace.utils import paginate_newest_first
+from orders.utils import customer_order_count, customer_orders, vendor_orders, vendor_revenue, vendor_revenue_totals
 from vendor.forms import VendorForm
-from vendor.models import Vendor
 
 
 def check_role_vendor(user):
@@ -161,11 +160,9 @@ def my_account(request):
 @login_required(login_url='login')
 @user_passes_test(check_role_customer)
 def customer_dashboard(request):
-    orders = Order.objects.filter(user=request.user, is_ordered=True)
-    recent_orders = orders.order_by('-created_at')[:5]
+    recent_orders, _ = paginate_newest_first(customer_orders(request.user), page_size=5)
     context = {
-        'orders': orders,
-        'orders_count': orders.count(),
+        'orders_count': customer_order_count(request.user),
         'recent_orders': recent_orders,
     }
     return render(request, 'accounts/customer_dashboard.html', context)
@@ -174,26 +171,21 @@ def customer_dashboard(request):
 @login_required(login_url='login')
 @user_passes_test(check_role_vendor)
 def vendor_dashboard(request):
-    vendor = Vendor.objects.get(user=request.user)
-    orders = Order.objects.filter(vendor__in=[vendor.id], is_ordered=True).order_by('-created_at')
+    vendor = request.vendor
+    orders = vendor_orders(vendor)
     recent_orders = orders[:5]
 
     # current month revenue
-    current_month = datetime.datetime.now().month
-    current_month_orders = orders.filter(vendor__in=[vendor.id], created_at__month=current_month)
-    current_month_revenue = 0
-    for i in current_month_orders:
-        current_month_revenue += i.get_total_by_vendor()['grand_total']
+    month_start = timezone.localdate().replace(day=1)
+    current_month_revenue = vendor_revenue(vendor, start=month_start)
 
     # total revenue
-    total_revenue = 0
-    for i in orders:
-        total_revenue += i.get_total_by_vendor()['grand_total']
+    totals = vendor_revenue_totals(vendor)
     context = {
         'orders': orders,
-        'orders_count': orders.count(),
+        'orders_count': totals['order_count'],
         'recent_orders': recent_orders,
-        'total_revenue': total_revenue,
+        'total_revenue': totals['gross'],
         'current_month_revenue': current_month_revenue,
     }
     return render(request, 'accounts/vendor_dashboard.html', context)
@@ -1,17 +1,21 @@
-import simplejson as json
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404
+from django.shortcuts import render, redirect
+from django.utils.dateparse import parse_date
 
 # Create your views here.
 from accounts.forms import UserProfileForm, UserInfoForm
-from accounts.models import UserProfile
+from marketplace.utils import next_page_url, paginate_newest_first
 from orders.models import Order, OrderedFood
+from orders.utils import customer_orders
 
 
 @login_required(login_url='login')
 def customer_profile(request):
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = request.user_profile
+    if not profile:
+        raise Http404('No UserProfile matches the given query.')
     if request.method == 'POST':
         profile_form = UserProfileForm(request.POST, request.FILES, instance=profile)
         user_form = UserInfoForm(request.POST, instance=request.user)
@@ -35,10 +39,28 @@ def customer_profile(request):
     return render(request, 'customers/customer_profile.html', context)
 
 
+def _parse_date(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
 def my_orders(request):
-    orders = Order.objects.filter(user=request.user, is_ordered=True).order_by('-created_at')
+    status = request.GET.get('status')
+    if status not in dict(Order.STATUS):
+        status = None
+    date_from = _parse_date(request.GET.get('from'))
+    date_to = _parse_date(request.GET.get('to'))
+    orders = customer_orders(request.user, status, date_from, date_to)
+    orders, next_cursor = paginate_newest_first(orders, request.GET.get('cursor'))
     context = {
         'orders': orders,
+        'next_page_url': next_page_url(request, next_cursor),
+        'statuses': Order.STATUS,
+        'status': status,
+        'date_from': date_from,
+        'date_to': date_to,
     }
     return render(request, 'customers/my_orders.html', context)
 
@@ -50,7 +72,7 @@ def order_details(request, order_number):
         subtotal = 0
         for item in ordered_food:
             subtotal += (item.price * item.quantity)
-        tax_data = json.loads(order.tax_data)
+        tax_data = order.tax_data or {}
         context = {
             'order': order,
             'ordered_food': ordered_food,
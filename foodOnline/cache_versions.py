@@ -0,0 +1,30 @@
+import time
+
+from django.core.cache import cache
+
+
+def _init_cache_version(key):
+    # Seed from the clock so an evicted counter never falls back onto an old, stale cache key
+    cache.add(key, int(time.time() * 1000), None)
+    return cache.get(key)
+
+
+def get_cache_versions(keys):
+    """Current value of each version counter, creating the missing ones."""
+    versions = cache.get_many(keys)
+    return [versions[key] if key in versions else _init_cache_version(key) for key in keys]
+
+
+def get_cache_version(key):
+    return get_cache_versions([key])[0]
+
+
+def bump_cache_version(key):
+    """Move the counter to a new version and return it, or None when it is not cached.
+
+    A counter that is not cached gets a new clock seeded value on its next read anyway.
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return None
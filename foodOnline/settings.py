@@ -56,9 +56,9 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.vendor_profile_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'orders.request_object.request_object_middleware',
 ]
 
 ROOT_URLCONF = 'foodOnline.urls'
@@ -104,6 +104,26 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Cached carts, taxes, search results and vendor pages are invalidated by bumping version keys in
+# the cache, so every web and worker process has to use the same one: Redis by default. Set
+# CACHE_BACKEND=django.core.cache.backends.locmem.LocMemCache only for a single process, e.g. tests.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config('CACHE_LOCATION', default='redis://127.0.0.1:6379/1'),
+    }
+}
+
+# Number of nearest vendors listed on the home page
+HOME_NEAREST_VENDORS = config('HOME_NEAREST_VENDORS', default=8, cast=int)
+
+# Seconds anonymous marketplace pages are served from the cache, 0 to turn it off
+ANONYMOUS_PAGE_CACHE_TIMEOUT = config('ANONYMOUS_PAGE_CACHE_TIMEOUT', default=60, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,30 @@
+from decimal import Decimal
+
+from accounts.models import User
+from menu.models import Category, FoodItem
+from vendor.models import Vendor
+
+
+def create_user(username, role=User.CUSTOMER):
+    user = User.objects.create_user(first_name=username, last_name='Test', username=username,
+                                    email=f'{username}@example.com', password='secret')
+    user.role = role
+    user.is_active = True
+    user.save()
+    return user
+
+
+def create_vendor(name):
+    user = create_user(name, User.RESTAURANT)
+    return Vendor.objects.create(user=user, user_profile=user.userprofile, vendor_name=name, vendor_slug=name,
+                                 vendor_license='vendor/license/license.png', is_approved=True)
+
+
+def create_fooditem(vendor=None, title='Jollof', price='10.00'):
+    if vendor is None:
+        vendor = create_vendor('vendor')
+    category, _ = Category.objects.get_or_create(vendor=vendor, category_name='Mains',
+                                                 slug=f'mains-{vendor.vendor_slug}')
+    return FoodItem.objects.create(vendor=vendor, category=category, food_title=title,
+                                   slug=f'{title}-{vendor.vendor_slug}', price=Decimal(price),
+                                   image='foodimages/food.png')
@@ -1,9 +1,9 @@
-from django.contrib.gis.db.models.functions import Distance
-from django.contrib.gis.geos import GEOSGeometry
-from django.contrib.gis.measure import D
+from django.conf import settings
 from django.shortcuts import render
 
+from marketplace.utils import cache_anonymous_page
 from vendor.models import Vendor
+from vendor.utils import nearest_vendors, set_open_status
 
 
 def get_or_set_current_location(request):
@@ -21,19 +21,21 @@ def get_or_set_current_location(request):
         return None
 
 
+@cache_anonymous_page
 def index(request):
-    if get_or_set_current_location(request):
-
-        pnt = GEOSGeometry('POINT(%s %s)' % (get_or_set_current_location(request)))
-
-        vendors = Vendor.objects.filter(user_profile__location__distance_lte=(pnt, D(km=1000))).annotate(
-            distance=Distance('user_profile__location', pnt)).order_by('distance')
-
-        for v in vendors:
-            v.kms = round(v.distance.km, 1)
+    location = get_or_set_current_location(request)
+    open_now = bool(request.GET.get('open_now'))
+    if location:
+        longitude, latitude = location
+        vendors = nearest_vendors(float(latitude), float(longitude), open_now=open_now)
     else:
-        vendors = Vendor.objects.filter(is_approved=True, user__is_active=True)[:8]
+        vendors = Vendor.objects.filter(is_approved=True, user__is_active=True)
+        if open_now:
+            vendors = vendors.open_at()
+        vendors = vendors.select_related('user_profile')[:settings.HOME_NEAREST_VENDORS]
+    set_open_status(vendors)
     context = {
-        'vendors': vendors
+        'vendors': vendors,
+        'open_now': open_now,
     }
     return render(request, 'index.html', context)
@@ -2,11 +2,26 @@ from django.contrib import admin
 
 # Register your models here.
 from marketplace.models import Cart, Tax
+from marketplace.utils import invalidate_cart_totals
 
 
 class CartAdmin(admin.ModelAdmin):
     list_display = ['user', 'fooditem', 'quantity', 'updated_at']
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_cart_totals(obj.user_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_cart_totals(obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for user_id in user_ids:
+            invalidate_cart_totals(user_id)
+
 
 class TaxAdmin(admin.ModelAdmin):
     list_display = ('tax_type', 'tax_percentage', 'is_active')
@@ -0,0 +1,50 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from vendor.models import Vendor
+
+
+class Command(BaseCommand):
+    help = ('Measure requests per second of the anonymous marketplace pages without and with caching. '
+            'Empties the cache, so run it against a development setup.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per page and mode.')
+
+    def handle(self, *args, **options):
+        paths = [reverse('index'), reverse('marketplace')]
+        vendor = Vendor.objects.filter(is_approved=True, user__is_active=True).order_by('pk').first()
+        if vendor is not None:
+            paths.append(reverse('vendor_detail', args=[vendor.vendor_slug]))
+
+        # The test environment lets the client use the "testserver" host
+        setup_test_environment()
+        try:
+            for path in paths:
+                # Uncached: no response cache and every cache emptied before each request
+                with override_settings(ANONYMOUS_PAGE_CACHE_TIMEOUT=0):
+                    before = self.requests_per_second(path, options['requests'], clear_cache=True)
+                cache.clear()
+                after = self.requests_per_second(path, options['requests'], clear_cache=False)
+                self.stdout.write(f'{path}: {before:.1f} req/s uncached, {after:.1f} req/s cached '
+                                  f'({after / before:.1f}x)')
+        finally:
+            teardown_test_environment()
+
+    def requests_per_second(self, path, count, clear_cache):
+        client = Client()
+        elapsed = 0
+        for _ in range(count):
+            if clear_cache:
+                cache.clear()
+            started = time.perf_counter()
+            response = client.get(path)
+            elapsed += time.perf_counter() - started
+            if response.status_code != 200:
+                raise RuntimeError(f'{path} returned {response.status_code}')
+        return count / elapsed
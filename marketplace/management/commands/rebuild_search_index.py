@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.search import reindex_vendors
+from vendor.models import Vendor
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the vendor search documents.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Vendors reindexed per batch.')
+
+    def handle(self, *args, **options):
+        vendor_ids = Vendor.objects.order_by('pk').values_list('pk', flat=True)
+        batch_size, last_id, indexed = options['batch_size'], 0, 0
+        while True:
+            batch = list(vendor_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            indexed += reindex_vendors(batch)
+            last_id = batch[-1]
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} vendor(s).'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from marketplace.search import reset_search_cache_stats, search_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the hit rate and latency of the search result cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after showing them.')
+
+    def handle(self, *args, **options):
+        stats = search_cache_stats()
+        self.stdout.write(f"Hits: {stats['hits']} ({stats['hit_ms']:.2f} ms on average)")
+        self.stdout.write(f"Misses: {stats['misses']} ({stats['miss_ms']:.2f} ms on average)")
+        self.stdout.write(f"Hit rate: {stats['hit_rate']:.1%}")
+        if options['reset']:
+            reset_search_cache_stats()
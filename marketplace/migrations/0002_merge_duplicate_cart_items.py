@@ -0,0 +1,24 @@
+# Generated by Django 4.1 on 2026-10-18 09:12
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    Cart = apps.get_model('marketplace', 'Cart')
+    duplicates = Cart.objects.values('user', 'fooditem').annotate(
+        rows=Count('id'), keep_id=Min('id'), total=Sum('quantity')).filter(rows__gt=1)
+    for row in duplicates:
+        Cart.objects.filter(id=row['keep_id']).update(quantity=row['total'])
+        Cart.objects.filter(user=row['user'], fooditem=row['fooditem']).exclude(id=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+    ]
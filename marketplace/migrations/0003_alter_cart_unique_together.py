@@ -0,0 +1,20 @@
+# Generated by Django 4.1 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('menu', '0001_initial'),
+        ('marketplace', '0002_merge_duplicate_cart_items'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='cart',
+            unique_together={('user', 'fooditem')},
+        ),
+    ]
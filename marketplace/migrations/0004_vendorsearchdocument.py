@@ -0,0 +1,62 @@
+# Generated by Django 4.1 on 2026-10-18 14:30
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_search_index(apps, schema_editor):
+    # The expression has to match SearchVector('document', config='simple') in marketplace.search
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX marketplace_vendorsearchdocument_document_gin ON marketplace_vendorsearchdocument "
+            "USING gin (to_tsvector('simple'::regconfig, COALESCE(document, '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS marketplace_vendorsearchdocument_document_gin')
+
+
+def build_search_documents(apps, schema_editor):
+    Vendor = apps.get_model('vendor', 'Vendor')
+    Category = apps.get_model('menu', 'Category')
+    FoodItem = apps.get_model('menu', 'FoodItem')
+    VendorSearchDocument = apps.get_model('marketplace', 'VendorSearchDocument')
+
+    parts = defaultdict(list)
+    for vendor_id, vendor_name in Vendor.objects.values_list('id', 'vendor_name'):
+        parts[vendor_id].append(vendor_name)
+    for vendor_id, name, description in Category.objects.values_list('vendor_id', 'category_name', 'description'):
+        parts[vendor_id] += [name, description]
+    for vendor_id, title, description in FoodItem.objects.filter(is_available=True).values_list(
+            'vendor_id', 'food_title', 'description'):
+        parts[vendor_id] += [title, description]
+    VendorSearchDocument.objects.bulk_create([
+        VendorSearchDocument(vendor_id=vendor_id, document=' '.join(part for part in vendor_parts if part))
+        for vendor_id, vendor_parts in parts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0001_initial'),
+        ('vendor', '0004_vendor_vendor_vend_created_4276ca_idx'),
+        ('marketplace', '0003_alter_cart_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorSearchDocument',
+            fields=[
+                ('vendor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='vendor.vendor')),
+                ('document', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 # Create your models here.
 from accounts.models import User
 from menu.models import FoodItem
+from vendor.models import Vendor
 
 
 class Cart(models.Model):
@@ -12,6 +13,9 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        unique_together = ('user', 'fooditem')
+
     def __unicode__(self):
         return self.user
 
@@ -26,3 +30,13 @@ class Tax(models.Model):
 
     def __str__(self):
         return self.tax_type
+
+
+class VendorSearchDocument(models.Model):
+    # Searchable text of a vendor: its name, categories and available food items, see marketplace.search
+    vendor = models.OneToOneField(Vendor, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    document = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.vendor)
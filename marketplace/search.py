@@ -0,0 +1,238 @@
+import hashlib
+import math
+import re
+import time
+from collections import defaultdict
+
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+
+from marketplace.models import VendorSearchDocument
+from foodOnline.cache_versions import bump_cache_version, get_cache_version
+from menu.models import Category, FoodItem
+from vendor.models import Vendor
+from vendor.utils import distance_km, geohash_cell_diagonal, geohash_center, geohash_encode
+
+SEARCH_INDEX_VERSION_KEY = 'vendor-search-index-version'
+SEARCH_RESULTS_VERSION_KEY = 'vendor-search-results-version'
+SEARCH_RESULTS_TIMEOUT = 10 * 60
+SEARCH_CONFIG = 'simple'
+SEARCH_RESULTS_LIMIT = 1000
+# The radius options of the search form; other radiuses are rounded up to one of them
+SEARCH_RADIUS_BUCKETS = (5, 10, 15, 25, 50, 75, 100)
+SEARCH_CACHE_STATS_KEYS = {
+    'hits': 'search-cache:hits',
+    'misses': 'search-cache:misses',
+    'hit_us': 'search-cache:hit-us',
+    'miss_us': 'search-cache:miss-us',
+}
+
+# (version, {token: {vendor_id: occurrences}}) of the fallback index loaded by this process
+_search_index = (None, {})
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def build_documents(vendor_ids):
+    """{vendor_id: document} from vendor names, category names and descriptions, and available food items."""
+    parts = defaultdict(list)
+    for vendor_id, vendor_name in Vendor.objects.filter(id__in=vendor_ids).values_list('id', 'vendor_name'):
+        parts[vendor_id].append(vendor_name)
+    for vendor_id, name, description in Category.objects.filter(vendor_id__in=parts).values_list(
+            'vendor_id', 'category_name', 'description'):
+        parts[vendor_id] += [name, description]
+    for vendor_id, title, description in FoodItem.objects.filter(vendor_id__in=parts, is_available=True).values_list(
+            'vendor_id', 'food_title', 'description'):
+        parts[vendor_id] += [title, description]
+    return {vendor_id: ' '.join(part for part in vendor_parts if part) for vendor_id, vendor_parts in parts.items()}
+
+
+def reindex_vendors(vendor_ids):
+    """Rebuild the search documents of the given vendors."""
+    documents = build_documents(vendor_ids)
+    VendorSearchDocument.objects.bulk_create(
+        [VendorSearchDocument(vendor_id=vendor_id, document=document, updated_at=timezone.now())
+         for vendor_id, document in documents.items()],
+        # Column name: Django 4.1 writes unique_fields into ON CONFLICT verbatim
+        update_conflicts=True, unique_fields=['vendor_id'], update_fields=['document', 'updated_at'],
+    )
+    invalidate_search_index()
+    return len(documents)
+
+
+def invalidate_search_index():
+    global _search_index
+    _search_index = (None, {})
+    bump_cache_version(SEARCH_INDEX_VERSION_KEY)
+    invalidate_search_results()
+
+
+def invalidate_search_results():
+    bump_cache_version(SEARCH_RESULTS_VERSION_KEY)
+
+
+def _get_inverted_index():
+    global _search_index
+    version = get_cache_version(SEARCH_INDEX_VERSION_KEY)
+    cached_version, index = _search_index
+    if cached_version != version:
+        index = defaultdict(dict)
+        for vendor_id, document in VendorSearchDocument.objects.values_list('vendor_id', 'document').iterator():
+            for token in tokenize(document):
+                index[token][vendor_id] = index[token].get(vendor_id, 0) + 1
+        _search_index = (version, index)
+    return index
+
+
+def _search_inverted_index(terms, vendors=None):
+    # Every term has to prefix-match a token of the document; rank by matched occurrences
+    index = _get_inverted_index()
+    allowed = set(vendors.values_list('id', flat=True)) if vendors is not None else None
+    scores = None
+    for term in terms:
+        matches = defaultdict(int)
+        for token, postings in index.items():
+            if token.startswith(term):
+                for vendor_id, occurrences in postings.items():
+                    matches[vendor_id] += occurrences
+        if scores is None:
+            scores = matches
+        else:
+            scores = {vendor_id: score + matches[vendor_id] for vendor_id, score in scores.items() if vendor_id in matches}
+    if allowed is not None:
+        scores = {vendor_id: score for vendor_id, score in scores.items() if vendor_id in allowed}
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [vendor_id for vendor_id, _ in ranked[:SEARCH_RESULTS_LIMIT]]
+
+
+def _search_postgres(terms, vendors=None):
+    # Imported here because django.contrib.postgres needs psycopg2
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+    vector = SearchVector('document', config=SEARCH_CONFIG)
+    query = SearchQuery(' & '.join(f'{term}:*' for term in terms), config=SEARCH_CONFIG, search_type='raw')
+    documents = VendorSearchDocument.objects.all()
+    if vendors is not None:
+        documents = documents.filter(vendor_id__in=vendors.values('id'))
+    # The expression matches the GIN index created in migration 0004_vendorsearchdocument
+    return list(
+        documents.annotate(search=vector, rank=SearchRank(vector, query))
+        .filter(search=query)
+        .order_by('-rank', 'vendor_id')
+        .values_list('vendor_id', flat=True)[:SEARCH_RESULTS_LIMIT]
+    )
+
+
+def search_vendor_ids(keyword, vendors=None):
+    """Ids of the vendors matching every word of keyword (as a prefix), best match first.
+
+    Only vendors of the given queryset are searched, so its filters apply before the results are capped.
+    """
+    terms = tokenize(keyword)
+    if not terms:
+        return []
+    if connections[VendorSearchDocument.objects.db].vendor == 'postgresql':
+        return _search_postgres(terms, vendors)
+    return _search_inverted_index(terms, vendors)
+
+
+def radius_bucket(radius):
+    for bucket in SEARCH_RADIUS_BUCKETS:
+        if radius <= bucket:
+            return bucket
+    return math.ceil(radius)
+
+
+def geohash_precision(radius):
+    # Cells of about 1.2 x 0.6 km below 25 km, 4.9 x 4.9 km above, small next to the radius either way
+    return 6 if radius < 25 else 5
+
+
+def _rank_vendors(keyword, center, radius):
+    vendors = Vendor.objects.filter(is_approved=True, user__is_active=True)
+    if center is not None:
+        vendors = vendors.near(center, radius)
+    matched_ids = search_vendor_ids(keyword, vendors) if keyword else None
+    if matched_ids is not None:
+        vendors = vendors.filter(id__in=matched_ids)
+    if center is not None:
+        return [(pk, location.y, location.x) for pk, location in vendors.values_list('id', 'location')]
+    if matched_ids is not None:
+        # Keep the search ranking
+        found = set(vendors.values_list('id', flat=True))
+        return [(pk, None) for pk in matched_ids if pk in found]
+    return [(pk, None) for pk in vendors.order_by('-created_at', '-id').values_list('id', flat=True)]
+
+
+def _count(key, delta=1):
+    if not cache.add(key, delta, None):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
+
+
+def search_results(keyword, latitude=None, longitude=None, radius=None):
+    """[(vendor_id, km or None)] of the approved vendors matching a search, best match or nearest first.
+
+    Results are cached per normalized keyword and, for a location search, per geohash cell and
+    radius bucket. The cached candidates are the vendors within the bucket radius plus a cell
+    diagonal of the centre of the cell, which covers the bucket radius around every point of the
+    cell. Distances are then measured from the searched point and cut down to the requested radius.
+    """
+    started = time.perf_counter()
+    keyword = ' '.join(tokenize(keyword))
+    center, cell, bucket, reach = None, '', '', None
+    if latitude is not None and longitude is not None and radius:
+        bucket = radius_bucket(radius)
+        precision = geohash_precision(bucket)
+        cell = geohash_encode(latitude, longitude, precision)
+        center_latitude, center_longitude = geohash_center(cell)
+        center = Point(center_longitude, center_latitude, srid=4326)
+        reach = bucket + geohash_cell_diagonal(precision)
+
+    version = get_cache_version(SEARCH_RESULTS_VERSION_KEY)
+    keyword_hash = hashlib.md5(keyword.encode()).hexdigest()
+    key = f'search-candidates:{version}:{keyword_hash}:{cell}:{bucket}'
+    results = cache.get(key)
+    if results is None:
+        results = _rank_vendors(keyword, center, reach)
+        cache.set(key, results, SEARCH_RESULTS_TIMEOUT)
+        counter, timer = 'misses', 'miss_us'
+    else:
+        counter, timer = 'hits', 'hit_us'
+    if center is not None:
+        distances = sorted((distance_km(latitude, longitude, vendor_latitude, vendor_longitude), pk)
+                           for pk, vendor_latitude, vendor_longitude in results)
+        results = [(pk, km) for km, pk in distances if km <= radius]
+
+    _count(SEARCH_CACHE_STATS_KEYS[counter])
+    _count(SEARCH_CACHE_STATS_KEYS[timer], int((time.perf_counter() - started) * 1000000))
+    return results
+
+
+def results_are_capped(keyword, results):
+    """Whether search_results() cut the keyword matches at SEARCH_RESULTS_LIMIT, so more vendors match."""
+    return bool(tokenize(keyword)) and len(results) >= SEARCH_RESULTS_LIMIT
+
+
+def search_cache_stats():
+    """Hit rate and mean latency in ms of search_results() since the counters were last reset."""
+    counters = cache.get_many(SEARCH_CACHE_STATS_KEYS.values())
+    hits, misses, hit_us, miss_us = (counters.get(SEARCH_CACHE_STATS_KEYS[name], 0)
+                                     for name in ('hits', 'misses', 'hit_us', 'miss_us'))
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        'hit_ms': hit_us / hits / 1000 if hits else 0.0,
+        'miss_ms': miss_us / misses / 1000 if misses else 0.0,
+    }
+
+
+def reset_search_cache_stats():
+    cache.delete_many(SEARCH_CACHE_STATS_KEYS.values())
@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from marketplace.models import Tax, VendorSearchDocument
+from marketplace.search import invalidate_search_index, reindex_vendors
+from marketplace.utils import invalidate_cart_totals, invalidate_tax_rules
+from menu.models import Category, FoodItem
+from vendor.models import Vendor
+
+
+@receiver(pre_save, sender=FoodItem)
+def pre_save_track_price(sender, instance, **kwargs):
+    if instance.pk:
+        old_price = FoodItem.objects.filter(pk=instance.pk).values_list('price', flat=True).first()
+        instance._price_changed = old_price is not None and old_price != instance.price
+
+
+@receiver(post_save, sender=FoodItem)
+def post_save_invalidate_cart_totals(sender, instance, created, **kwargs):
+    if getattr(instance, '_price_changed', False):
+        invalidate_cart_totals()
+
+
+@receiver(post_delete, sender=FoodItem)
+def post_delete_invalidate_cart_totals(sender, instance, **kwargs):
+    invalidate_cart_totals()
+
+
+@receiver(post_save, sender=Tax)
+@receiver(post_delete, sender=Tax)
+def invalidate_tax_rules_on_change(sender, instance, **kwargs):
+    invalidate_tax_rules()
+
+
+@receiver(post_save, sender=Vendor)
+def post_save_reindex_vendor(sender, instance, **kwargs):
+    reindex_vendors([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=FoodItem)
+def post_save_reindex_menu_vendor(sender, instance, **kwargs):
+    reindex_vendors([instance.vendor_id])
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=FoodItem)
+def post_delete_reindex_menu_vendor(sender, instance, **kwargs):
+    # After commit, so a menu deleted together with its vendor cannot recreate the vendor's document
+    vendor_id = instance.vendor_id
+    transaction.on_commit(lambda: reindex_vendors([vendor_id]))
+
+
+@receiver(post_delete, sender=VendorSearchDocument)
+def invalidate_search_index_on_delete(sender, instance, **kwargs):
+    invalidate_search_index()
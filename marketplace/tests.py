@@ -1,3 +1,297 @@
-from django.test import TestCase
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
 # Create your tests here.
+from foodOnline.testing import create_fooditem, create_user, create_vendor
+from marketplace.models import Cart, Tax
+from marketplace.search import _search_inverted_index, search_cache_stats, search_results, search_vendor_ids
+from marketplace.utils import (apply_cart_delta, decrease_cart_quantity, encode_cursor, get_cart_totals,
+                               get_tax_rules, increase_cart_quantity, snapshot_cart_totals)
+from menu.models import Category, FoodItem
+from vendor.models import Vendor
+
+XHR = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+class CartCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fooditem = create_fooditem()
+        self.customer = create_user('customer')
+        self.client.force_login(self.customer)
+
+    def test_cart_changes_are_written_through_to_cache(self):
+        get_cart_totals(self.customer.pk)
+        url = reverse('add_to_cart', args=[self.fooditem.id])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, **XHR)
+            response = self.client.get(url, **XHR).json()
+        self.assertFalse(any('SUM(' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(response['cart_counter']['cart_count'], 2)
+        self.assertEqual(Decimal(response['cart_amount']['subtotal']), Decimal('20.00'))
+
+        response = self.client.get(reverse('decrease_cart', args=[self.fooditem.id]), **XHR).json()
+        self.assertEqual(response['cart_counter']['cart_count'], 1)
+        self.assertEqual(get_cart_totals(self.customer.pk)['subtotal'], Decimal('10.00'))
+
+    def test_totals_recomputed_during_a_change_are_not_counted_twice(self):
+        snapshot = snapshot_cart_totals(self.customer.pk)
+        increase_cart_quantity(self.customer, self.fooditem)
+        # A concurrent request caches the new totals between the cart write and the version bump
+        get_cart_totals(self.customer.pk)
+        apply_cart_delta(snapshot, 1, self.fooditem.price)
+        self.assertEqual(get_cart_totals(self.customer.pk)['cart_count'], 1)
+
+    def test_price_change_invalidates_cached_totals(self):
+        Cart.objects.create(user=self.customer, fooditem=self.fooditem, quantity=2)
+        self.assertEqual(get_cart_totals(self.customer.pk)['subtotal'], Decimal('20.00'))
+        self.fooditem.price = Decimal('12.50')
+        self.fooditem.save()
+        self.assertEqual(get_cart_totals(self.customer.pk)['subtotal'], Decimal('25.00'))
+
+
+class TaxRulesCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.vat = Tax.objects.create(tax_type='VAT', tax_percentage=Decimal('7.50'))
+
+    def test_tax_rules_are_served_from_cache_until_changed(self):
+        self.assertEqual(get_tax_rules(), [('VAT', Decimal('7.50'))])
+        with self.assertNumQueries(0):
+            get_tax_rules()
+
+        self.vat.tax_percentage = Decimal('5.00')
+        self.vat.save()
+        Tax.objects.create(tax_type='Service', tax_percentage=Decimal('2.00'), is_active=False)
+        self.assertEqual(get_tax_rules(), [('VAT', Decimal('5.00'))])
+
+
+class CartQuantityConcurrencyTest(TransactionTestCase):
+    def setUp(self):
+        self.fooditem = create_fooditem()
+        self.customer = create_user('customer')
+
+    def test_parallel_increments_are_not_lost(self):
+        threads_count, clicks = 8, 5
+        barrier = threading.Barrier(threads_count)
+
+        def click():
+            barrier.wait()
+            try:
+                for _ in range(clicks):
+                    increase_cart_quantity(self.customer, self.fooditem)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=click) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        cart_item = Cart.objects.get(user=self.customer, fooditem=self.fooditem)
+        self.assertEqual(cart_item.quantity, threads_count * clicks)
+
+    def test_decrease_removes_last_unit(self):
+        self.assertEqual(increase_cart_quantity(self.customer, self.fooditem), (1, True))
+        self.assertEqual(increase_cart_quantity(self.customer, self.fooditem), (2, False))
+        self.assertEqual(decrease_cart_quantity(self.customer, self.fooditem), 1)
+        self.assertEqual(decrease_cart_quantity(self.customer, self.fooditem), 0)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+        with self.assertRaises(Cart.DoesNotExist):
+            decrease_cart_quantity(self.customer, self.fooditem)
+
+
+class ListingPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.vendors = [create_vendor(f'grill{i}') for i in range(25)]
+
+    def get_all_pages(self, path, params):
+        names, page_queries, url = [], [], path
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            page_queries.append(len(queries))
+            names += [vendor.vendor_name for vendor in response.context['vendors']]
+            # The next page url carries every parameter of the current page
+            params = None
+            url = response.context['next_page_url'] and path + response.context['next_page_url']
+        return names, page_queries, response
+
+    def test_marketplace_pages_with_a_cursor(self):
+        names, page_queries, response = self.get_all_pages(reverse('marketplace'), {})
+        self.assertEqual(names, [vendor.vendor_name for vendor in reversed(self.vendors)])
+        self.assertEqual(len(page_queries), 2)
+        self.assertEqual(page_queries[0], page_queries[1])
+        self.assertEqual(response.context['vendor_count'], 25)
+        self.assertFalse(response.context['vendor_count_is_estimate'])
+
+    def test_rows_created_in_the_same_millisecond_are_not_skipped(self):
+        created_at = timezone.now().replace(microsecond=500000)
+        for microsecond, vendor in enumerate(self.vendors):
+            Vendor.objects.filter(pk=vendor.pk).update(created_at=created_at.replace(microsecond=500000 + microsecond))
+        names, _, _ = self.get_all_pages(reverse('marketplace'), {})
+        self.assertEqual(names, [vendor.vendor_name for vendor in reversed(self.vendors)])
+
+    def test_malformed_cursor_serves_the_first_page(self):
+        cursor = encode_cursor(['x', 1])
+        response = self.client.get(reverse('marketplace'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['vendors'][0].vendor_name, self.vendors[-1].vendor_name)
+        params = {'address': 'Lagos', 'lat': '', 'lng': '', 'radius': '', 'keyword': 'grill', 'cursor': cursor}
+        self.assertEqual(self.client.get(reverse('search'), params).status_code, 200)
+
+    def test_search_results_are_paginated(self):
+        params = {'address': 'Lagos', 'lat': '', 'lng': '', 'radius': '', 'keyword': 'grill'}
+        names, page_queries, response = self.get_all_pages(reverse('search'), params)
+        self.assertEqual(sorted(names), sorted(vendor.vendor_name for vendor in self.vendors))
+        self.assertEqual(len(page_queries), 2)
+        self.assertEqual(response.context['vendor_count'], 25)
+
+
+class VendorSearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.pizza = create_vendor('Pizzeria')
+        self.grill = create_vendor('Grillhouse')
+        category = Category.objects.create(vendor=self.grill, category_name='Pizza and grills', slug='grills')
+        self.suya = FoodItem.objects.create(vendor=self.grill, category=category, food_title='Spicy suya',
+                                            slug='suya', price=Decimal('5.00'), image='foodimages/suya.png',
+                                            description='Grilled beef skewers')
+
+    def test_documents_follow_menu_changes(self):
+        self.assertEqual(search_vendor_ids('suya'), [self.grill.id])
+        self.assertEqual(search_vendor_ids('skew'), [self.grill.id])
+        self.assertEqual(set(search_vendor_ids('piz')), {self.pizza.id, self.grill.id})
+        self.assertEqual(search_vendor_ids('spicy grilled'), [self.grill.id])
+
+        self.suya.is_available = False
+        self.suya.save()
+        self.assertEqual(search_vendor_ids('suya'), [])
+
+        self.grill.vendor_name = 'Suya Spot'
+        self.grill.save()
+        self.assertEqual(search_vendor_ids('suya spot'), [self.grill.id])
+
+    def test_fallback_index_ranks_by_matches(self):
+        self.assertEqual(_search_inverted_index(['grill']), [self.grill.id])
+        self.assertEqual(_search_inverted_index(['pizz']), [self.pizza.id, self.grill.id])
+        self.assertEqual(_search_inverted_index(['pizz', 'suya']), [self.grill.id])
+        with self.assertNumQueries(0):
+            _search_inverted_index(['suya'])
+
+    def test_search_view_uses_the_index(self):
+        params = {'address': 'Lagos', 'lat': '', 'lng': '', 'radius': '', 'keyword': 'suya'}
+        response = self.client.get(reverse('search'), params)
+        self.assertEqual(response.context['vendors'], [self.grill])
+
+    def test_search_results_are_cached_until_the_menu_changes(self):
+        self.assertEqual(search_results('Suya'), [(self.grill.id, None)])
+        with self.assertNumQueries(0):
+            self.assertEqual(search_results(' suya '), [(self.grill.id, None)])
+        stats = search_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+        self.suya.is_available = False
+        self.suya.save()
+        self.assertEqual(search_results('suya'), [])
+
+    def test_results_are_capped_after_the_approval_filter(self):
+        Vendor.objects.filter(pk=self.pizza.pk).update(is_approved=False)
+        with mock.patch('marketplace.search.SEARCH_RESULTS_LIMIT', 1):
+            self.assertEqual(search_results('pizz'), [(self.grill.id, None)])
+
+    def test_capped_result_count_is_shown_as_a_lower_bound(self):
+        params = {'address': 'Lagos', 'lat': '', 'lng': '', 'radius': '', 'keyword': 'pizz'}
+        with mock.patch('marketplace.search.SEARCH_RESULTS_LIMIT', 1):
+            response = self.client.get(reverse('search'), params)
+        self.assertContains(response, "1+ Restaurant's found")
+        cache.clear()
+        response = self.client.get(reverse('search'), params)
+        self.assertContains(response, "2 Restaurant's found")
+
+    def test_location_results_are_cut_to_the_requested_radius(self):
+        for vendor, (latitude, longitude) in ((self.pizza, ('6.5244', '3.3792')), (self.grill, ('6.6018', '3.3515'))):
+            profile = vendor.user_profile
+            profile.latitude, profile.longitude = latitude, longitude
+            profile.save()
+        self.assertEqual([pk for pk, _ in search_results('', 6.45, 3.40, 25)], [self.pizza.id, self.grill.id])
+        self.assertEqual([pk for pk, _ in search_results('', 6.45, 3.40, 10)], [self.pizza.id])
+        # Same cell and radius bucket as the 10 km search
+        with self.assertNumQueries(0):
+            self.assertEqual(search_results('', 6.4501, 3.4001, 7), [])
+
+        profile = self.pizza.user_profile
+        profile.latitude, profile.longitude = '6.4600', '3.4000'
+        profile.save()
+        self.assertEqual([pk for pk, _ in search_results('', 6.45, 3.40, 7)], [self.pizza.id])
+
+
+    def test_distances_are_measured_from_the_searched_point(self):
+        profile = self.pizza.user_profile
+        profile.latitude, profile.longitude = '6.5244', '3.3792'
+        profile.save()
+        self.assertEqual([(pk, round(km, 1)) for pk, km in search_results('', 6.45, 3.40, 10)], [(self.pizza.id, 8.6)])
+        # 8.4 km from the centre of the geohash cell, 8.6 km from the searched point
+        self.assertEqual(search_results('', 6.45, 3.40, 8.5), [])
+
+
+class VendorPageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fooditem = create_fooditem()
+        self.vendor = self.fooditem.vendor
+        self.customer = create_user('customer')
+        self.client.force_login(self.customer)
+        Cart.objects.create(user=self.customer, fooditem=self.fooditem, quantity=1)
+
+    def get_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('vendor_detail', args=[self.vendor.vendor_slug]))
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def test_page_renders_from_snapshot_until_the_menu_changes(self):
+        self.get_page()
+        response, queries = self.get_page()
+        self.assertEqual(response.context['categories'][0]['fooditems'][0]['title'], 'Jollof')
+        self.assertFalse([sql for sql in queries if 'menu_' in sql or 'vendor_openinghour' in sql])
+        self.assertEqual(len([sql for sql in queries if 'marketplace_cart' in sql]), 1)
+
+        self.fooditem.food_title = 'Fried rice'
+        self.fooditem.save()
+        response, queries = self.get_page()
+        self.assertEqual(response.context['categories'][0]['fooditems'][0]['title'], 'Fried rice')
+
+    def test_unknown_slug_is_not_found(self):
+        response = self.client.get(reverse('vendor_detail', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+
+class AnonymousPageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.vendor = create_fooditem().vendor
+        self.url = reverse('vendor_detail', args=[self.vendor.vendor_slug])
+
+    def test_anonymous_pages_are_served_from_cache(self):
+        response = self.client.get(self.url)
+        self.assertIn('Cookie', response['Vary'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).content, response.content)
+
+    def test_signed_in_users_are_not_served_cached_pages(self):
+        self.client.get(self.url)
+        self.client.force_login(self.vendor.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['vendor'], self.vendor)
@@ -0,0 +1,290 @@
+import base64
+import bisect
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Q, Sum
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+
+from foodOnline.cache_versions import bump_cache_version, get_cache_version, get_cache_versions
+from marketplace.models import Cart, Tax
+
+CART_CACHE_TIMEOUT = 60 * 60
+CART_GENERATION_KEY = 'cart-summary-generation'
+TAX_VERSION_KEY = 'tax-rules-version'
+LISTING_PAGE_SIZE = 20
+# Below this many estimated rows an exact COUNT(*) is cheap enough
+EXACT_COUNT_THRESHOLD = 10000
+
+# (version, rules) of the tax table loaded by this process
+_tax_rules = (None, [])
+
+
+def get_tax_rules():
+    """Active taxes as a list of (tax_type, Decimal percentage), reloaded only when a Tax changes."""
+    global _tax_rules
+    version = get_cache_version(TAX_VERSION_KEY)
+    cached_version, rules = _tax_rules
+    if cached_version != version:
+        rules = list(Tax.objects.filter(is_active=True).order_by('pk').values_list('tax_type', 'tax_percentage'))
+        _tax_rules = (version, rules)
+    return rules
+
+
+def invalidate_tax_rules():
+    global _tax_rules
+    _tax_rules = (None, [])
+    bump_cache_version(TAX_VERSION_KEY)
+
+
+def calculate_tax(subtotal):
+    tax_dict = {}
+    for tax_type, tax_percentage in get_tax_rules():
+        tax_amount = round((tax_percentage * subtotal) / 100, 2)
+
+        tax_dict.update({tax_type: {str(tax_percentage): tax_amount}})
+    return tax_dict
+
+
+def build_cart_summary(subtotal, cart_count):
+    tax_dict = calculate_tax(subtotal)
+    tax = sum(x for key in tax_dict.values() for x in key.values())
+    return {
+        'cart_count': cart_count,
+        'subtotal': subtotal,
+        'tax': tax,
+        'grand_total': subtotal + tax,
+        'tax_dict': tax_dict,
+    }
+
+
+def _cart_version_key(user_id):
+    return f'cart-summary-version:{user_id}'
+
+
+def _cart_totals_key(generation, user_id, version):
+    return f'cart-summary:{generation}:{user_id}:{version}'
+
+
+def _get_cart_versions(user_id):
+    generation, version = get_cache_versions([CART_GENERATION_KEY, _cart_version_key(user_id)])
+    return generation, version
+
+
+def get_cart_totals(user_id):
+    generation, version = _get_cart_versions(user_id)
+    key = _cart_totals_key(generation, user_id, version)
+    totals = cache.get(key)
+    if totals is None:
+        # Count and subtotal come from one aggregate over the cart joined to FoodItem.price
+        totals = Cart.objects.filter(user_id=user_id).aggregate(
+            cart_count=Sum('quantity'),
+            subtotal=Sum(F('fooditem__price') * F('quantity')),
+        )
+        totals = {'cart_count': totals['cart_count'] or 0, 'subtotal': totals['subtotal'] or 0}
+        cache.set(key, totals, CART_CACHE_TIMEOUT)
+    return totals
+
+
+def snapshot_cart_totals(user_id):
+    """The user's cached cart totals as they stand before a change. Take it before writing the cart.
+
+    Totals cached before the write cannot include it, so apply_cart_delta() adds it exactly once.
+    """
+    generation, version = _get_cart_versions(user_id)
+    return user_id, generation, version, cache.get(_cart_totals_key(generation, user_id, version))
+
+
+def apply_cart_delta(snapshot, quantity, amount):
+    """Write a cart change through to the cached totals instead of recomputing them.
+
+    Every change moves the user to a new version. The delta is only applied when this call
+    was the sole writer since the snapshot was taken; otherwise the new version starts empty
+    and the next read recomputes from the database.
+    """
+    user_id, generation, version, totals = snapshot
+    new_version = bump_cache_version(_cart_version_key(user_id))
+    if totals is not None and new_version == version + 1:
+        totals = {'cart_count': totals['cart_count'] + quantity, 'subtotal': totals['subtotal'] + amount}
+        cache.set(_cart_totals_key(generation, user_id, new_version), totals, CART_CACHE_TIMEOUT)
+
+
+def invalidate_cart_totals(user_id=None):
+    """Drop the cached totals of one user, or of every user when prices change."""
+    key = _cart_version_key(user_id) if user_id is not None else CART_GENERATION_KEY
+    bump_cache_version(key)
+
+
+def increase_cart_quantity(user, fooditem):
+    """Add one unit of fooditem to the user's cart and return (new quantity, created)."""
+    cart_items = Cart.objects.filter(user=user, fooditem=fooditem)
+    if not cart_items.update(quantity=F('quantity') + 1):
+        try:
+            with transaction.atomic():
+                Cart.objects.create(user=user, fooditem=fooditem, quantity=1)
+            return 1, True
+        except IntegrityError:
+            # A concurrent request inserted the row first
+            cart_items.update(quantity=F('quantity') + 1)
+    return cart_items.values_list('quantity', flat=True).get(), False
+
+
+def decrease_cart_quantity(user, fooditem):
+    """Remove one unit of fooditem from the user's cart and return the new quantity."""
+    cart_items = Cart.objects.filter(user=user, fooditem=fooditem)
+    if cart_items.filter(quantity__gt=1).update(quantity=F('quantity') - 1):
+        return cart_items.values_list('quantity', flat=True).first() or 0
+    deleted, _ = cart_items.filter(quantity__lte=1).delete()
+    if not deleted:
+        raise Cart.DoesNotExist
+    return 0
+
+
+def compute_cart_summary(user):
+    totals = get_cart_totals(user.pk)
+    return build_cart_summary(totals['subtotal'], totals['cart_count'])
+
+
+def get_cart_summary(request):
+    """Cart count and amounts for the current user, computed at most once per request."""
+    if not hasattr(request, '_cart_summary'):
+        if request.user.is_authenticated:
+            request._cart_summary = compute_cart_summary(request.user)
+        else:
+            request._cart_summary = {'cart_count': 0, 'subtotal': 0, 'tax': 0, 'grand_total': 0, 'tax_dict': {}}
+    return request._cart_summary
+
+
+def clear_cart_summary(request):
+    request.__dict__.pop('_cart_summary', None)
+
+
+def update_cart_summary(request, snapshot, quantity, amount):
+    apply_cart_delta(snapshot, quantity, amount)
+    clear_cart_summary(request)
+
+
+def get_cart_response_data(request):
+    summary = get_cart_summary(request)
+    return {
+        'cart_counter': {'cart_count': summary['cart_count']},
+        'cart_amount': {
+            'subtotal': summary['subtotal'],
+            'tax': summary['tax'],
+            'grand_total': summary['grand_total'],
+            'tax_dict': summary['tax_dict'],
+        },
+    }
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+
+
+def paginate_newest_first(queryset, cursor=None, page_size=LISTING_PAGE_SIZE):
+    """One page of a queryset, newest first, and the cursor of the next page (None on the last page).
+
+    Pages are keyed on (created_at, id) so deep pages cost the same as the first one.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    position = decode_cursor(cursor) if cursor else None
+    if isinstance(position, list) and len(position) == 2:
+        # A cursor that does not parse starts over from the first page
+        try:
+            created_at, pk = parse_datetime(position[0]), int(position[1])
+        except (ValueError, TypeError):
+            created_at = None
+        if created_at is not None:
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    page = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        # Full microsecond precision, rows created in the same millisecond must not be skipped
+        next_cursor = encode_cursor([page[-1].created_at.isoformat(), page[-1].pk])
+    return page, next_cursor
+
+
+def paginate_vendors(vendors, cursor=None, page_size=LISTING_PAGE_SIZE):
+    return paginate_newest_first(vendors, cursor, page_size)
+
+
+def paginate_ranked(ranked, cursor=None, page_size=LISTING_PAGE_SIZE):
+    """One page of ids from a list of (sort key, id) in ascending order, and the cursor of the next page.
+
+    The cursor is the last (sort key, id) shown; the next page starts right after it, found by bisection.
+    """
+    start = 0
+    position = decode_cursor(cursor) if cursor else None
+    if isinstance(position, list) and len(position) == 2:
+        try:
+            start = bisect.bisect_right(ranked, tuple(position))
+        except TypeError:
+            start = 0
+    page = ranked[start:start + page_size]
+    next_cursor = encode_cursor(list(page[-1])) if start + page_size < len(ranked) else None
+    return [pk for _, pk in page], next_cursor
+
+
+def next_page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'?{params.urlencode()}'
+
+
+def estimated_count(queryset):
+    """(count, is_estimate): the planner's row estimate on PostgreSQL for large results, else COUNT(*)."""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate >= EXACT_COUNT_THRESHOLD:
+            return estimate, True
+    return queryset.count(), False
+
+
+def cache_anonymous_page(view_func):
+    """Serve anonymous GET requests from a short-lived cache of the whole response.
+
+    Responses vary on the visitor's session location. They are not cached when they store
+    something in the session, set a cookie or use the CSRF token, nor when messages are waiting.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        timeout = settings.ANONYMOUS_PAGE_CACHE_TIMEOUT
+        if (not timeout or request.method not in ('GET', 'HEAD') or request.user.is_authenticated
+                or len(get_messages(request))):
+            return view_func(request, *args, **kwargs)
+
+        location = f"{request.session.get('lat')},{request.session.get('lng')}"
+        digest = hashlib.md5(f'{request.get_full_path()}|{location}'.encode()).hexdigest()
+        key = f'anonymous-page:{digest}'
+        response = cache.get(key)
+        if response is None:
+            response = view_func(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            if (response.status_code == 200 and not response.cookies and not request.session.modified
+                    and not request.META.get('CSRF_COOKIE_USED')):
+                cache.set(key, response, timeout)
+        return response
+    return wrapper
@@ -1,45 +1,45 @@
-from datetime import date, datetime
-
 from django.contrib.auth.decorators import login_required
-from django.contrib.gis.db.models.functions import Distance
-from django.db.models import Prefetch, Q
-from django.http import HttpResponse, JsonResponse
-from django.shortcuts import render, get_object_or_404, redirect
-from django.contrib.gis.geos import GEOSGeometry
-from django.contrib.gis.measure import D
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import render, redirect
+from django.utils import timezone
 
 # Create your views here.
-from accounts.models import UserProfile
-from marketplace.context_processors import get_cart_counter, get_cart_amounts
 from marketplace.models import Cart
-from menu.models import Category, FoodItem
+from marketplace.search import results_are_capped, search_results
+from marketplace.utils import (cache_anonymous_page, decrease_cart_quantity, estimated_count,
+                               get_cart_response_data, increase_cart_quantity, next_page_url, paginate_ranked,
+                               paginate_vendors, snapshot_cart_totals, update_cart_summary)
+from menu.models import FoodItem
 from orders.forms import OrderForm
-from vendor.models import Vendor, OpeningHour
+from vendor.models import Vendor
+from vendor.utils import get_vendor_page, is_open_at, open_status_for, set_open_status, week_minute
 
 
+@cache_anonymous_page
 def marketplace(request):
-    vendors = Vendor.objects.filter(is_approved=True, user__is_active=True).order_by('-created_at')
-    vendor_count = vendors.count()
+    vendors = Vendor.objects.filter(is_approved=True, user__is_active=True)
+    vendor_count, vendor_count_is_estimate = estimated_count(vendors)
+    vendors, next_cursor = paginate_vendors(vendors.select_related('user_profile'), request.GET.get('cursor'))
+    set_open_status(vendors)
     context = {
         'vendors': vendors,
         'vendor_count': vendor_count,
+        'vendor_count_is_estimate': vendor_count_is_estimate,
+        'next_page_url': next_page_url(request, next_cursor),
     }
     return render(request, 'marketplace/listings.html', context)
 
 
+@cache_anonymous_page
 def vendor_detail(request, vendor_slug):
-    vendor = get_object_or_404(Vendor, vendor_slug=vendor_slug)
-    categories = Category.objects.filter(vendor=vendor).prefetch_related(
-        Prefetch(
-            'fooditems',
-            queryset=FoodItem.objects.filter(is_available=True)
-        )
-    )
-
-    opening_hours = OpeningHour.objects.filter(vendor=vendor).order_by('day', '-from_hour')
+    page = get_vendor_page(vendor_slug)
+    if page is None:
+        raise Http404('No Vendor matches the given query.')
+    vendor = page['vendor']
+    vendor._is_open = is_open_at(page['schedule'], week_minute())
 
-    today = date.today().isoweekday()
-    current_opening_hours = OpeningHour.objects.filter(vendor=vendor, day=today)
+    today = timezone.localdate().isoweekday()
+    current_opening_hours = [hour for hour in page['opening_hours'] if hour.day == today]
 
     if request.user.is_authenticated:
         cart_items = Cart.objects.filter(user=request.user)
@@ -47,10 +47,11 @@ def vendor_detail(request, vendor_slug):
         cart_items = None
     context = {
         'vendor': vendor,
-        'categories': categories,
+        'categories': page['categories'],
         "cart_items": cart_items,
-        'opening_hour': opening_hours,
+        'opening_hour': page['opening_hours'],
         'current_opening_hours': current_opening_hours,
+        'menu_version': page['version'],
     }
     return render(request, 'marketplace/vendor_detail.html', context)
 
@@ -61,25 +62,15 @@ def add_to_cart(request, food_id=None):
             # Check if the food item exists
             try:
                 fooditem = FoodItem.objects.get(id=food_id)
-                try:
-                    chkCart = Cart.objects.get(user=request.user, fooditem=fooditem)
-                    # Increase the cart quantity
-                    chkCart.quantity += 1
-                    chkCart.save()
-                    return JsonResponse({'status': 'Success',
-                                         'message': 'Increase the cart message',
-                                         'cart_counter': get_cart_counter(request),
-                                         "qty": chkCart.quantity,
-                                         'cart_amount': get_cart_amounts(request)})
-                except:
-                    chkCart = Cart.objects.create(user=request.user, fooditem=fooditem, quantity=1)
-                    return JsonResponse({'status': 'Success',
-                                         'message': 'Added the food to the cart',
-                                         'cart_counter': get_cart_counter(request),
-                                         "qty": chkCart.quantity,
-                                         'cart_amount': get_cart_amounts(request)})
-            except:
+            except FoodItem.DoesNotExist:
                 return JsonResponse({'status': 'Failed', 'message': 'This food does not exist!'})
+            snapshot = snapshot_cart_totals(request.user.pk)
+            quantity, created = increase_cart_quantity(request.user, fooditem)
+            update_cart_summary(request, snapshot, 1, fooditem.price)
+            return JsonResponse({'status': 'Success',
+                                 'message': 'Added the food to the cart' if created else 'Increase the cart message',
+                                 "qty": quantity,
+                                 **get_cart_response_data(request)})
         else:
             return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
     else:
@@ -92,25 +83,19 @@ def decrease_cart(request, food_id=None):
             # Check if the food item exists
             try:
                 fooditem = FoodItem.objects.get(id=food_id)
-                try:
-                    chkCart = Cart.objects.get(user=request.user, fooditem=fooditem)
-                    if chkCart.quantity > 1:
-                        # Decrease the cart quantity
-                        chkCart.quantity -= 1
-                        chkCart.save()
-                    else:
-                        chkCart.delete()
-                        chkCart.quantity = 0
-                    return JsonResponse({'status': 'Success',
-                                         'message': 'Decrease the cart message',
-                                         'cart_counter': get_cart_counter(request),
-                                         "qty": chkCart.quantity,
-                                         'cart_amount': get_cart_amounts(request)
-                                         })
-                except:
-                    return JsonResponse({'status': 'Failed', 'message': 'You do not have this item in your cart.'})
-            except:
+            except FoodItem.DoesNotExist:
                 return JsonResponse({'status': 'Failed', 'message': 'This food does not exist!'})
+            snapshot = snapshot_cart_totals(request.user.pk)
+            try:
+                quantity = decrease_cart_quantity(request.user, fooditem)
+            except Cart.DoesNotExist:
+                return JsonResponse({'status': 'Failed', 'message': 'You do not have this item in your cart.'})
+            update_cart_summary(request, snapshot, -1, -fooditem.price)
+            return JsonResponse({'status': 'Success',
+                                 'message': 'Decrease the cart message',
+                                 "qty": quantity,
+                                 **get_cart_response_data(request)
+                                 })
         else:
             return JsonResponse({'status': 'Failed', 'message': 'Invalid request!'})
     else:
@@ -119,7 +104,7 @@ def decrease_cart(request, food_id=None):
 
 @login_required(login_url='login')
 def cart(request):
-    cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
+    cart_items = Cart.objects.filter(user=request.user).select_related('fooditem__vendor').order_by('created_at')
     context = {
         'cart_items': cart_items,
     }
@@ -130,14 +115,16 @@ def delete_cart(request, cart_id):
     if request.user.is_authenticated:
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             try:
+                snapshot = snapshot_cart_totals(request.user.pk)
                 # check if the cart item exists
-                cart_item = Cart.objects.get(user=request.user, id=cart_id)
+                cart_item = Cart.objects.select_related('fooditem').get(user=request.user, id=cart_id)
                 if cart_item:
                     cart_item.delete()
+                    update_cart_summary(request, snapshot, -cart_item.quantity,
+                                        -cart_item.fooditem.price * cart_item.quantity)
                     return JsonResponse({'status': 'Success',
                                          'message': 'Cart item has been deleted.',
-                                         'cart_counter': get_cart_counter(request),
-                                         'cart_amount': get_cart_amounts(request)
+                                         **get_cart_response_data(request)
                                          })
             except:
                 return JsonResponse({'status': 'Failed', 'message': 'Cart item not exist!'})
@@ -145,6 +132,7 @@ def delete_cart(request, cart_id):
             return JsonResponse({'status': 'Failed', 'message': 'Invalid request'})
 
 
+@cache_anonymous_page
 def search(request):
     if not 'address' in request.GET:
         return redirect('marketplace')
@@ -155,32 +143,34 @@ def search(request):
         radius = request.GET['radius']
         keyword = request.GET['keyword']
 
-        fetch_vendors_by_fooditems = FoodItem.objects.filter(food_title__icontains=keyword,
-                                                             is_available=True).values_list(
-            'vendor', flat=True)
-
-        vendors = Vendor.objects.filter(
-            Q(id__in=fetch_vendors_by_fooditems) | Q(vendor_name__icontains=keyword, is_approved=True,
-                                                     user__is_active=True))
-
         if latitude and longitude and radius:
-            pnt = GEOSGeometry(f'POINT({longitude} {latitude})')
-
-            vendors = Vendor.objects.filter(
-                Q(id__in=fetch_vendors_by_fooditems) | Q(vendor_name__icontains=keyword, is_approved=True,
-                                                         user__is_active=True),
-                user_profile__location__distance_lte=(pnt, D(km=radius))).annotate(
-                distance=Distance('user_profile__location', pnt)).order_by('distance')
-
-            for v in vendors:
-                v.kms = round(v.distance.km, 1)
-
-        vendor_count = vendors.count()
+            results = search_results(keyword, float(latitude), float(longitude), float(radius))
+        else:
+            results = search_results(keyword)
+        vendor_count_is_capped = results_are_capped(keyword, results)
+        if request.GET.get('open_now'):
+            open_status = open_status_for([pk for pk, _ in results])
+            results = [(pk, km) for pk, km in results if open_status[pk]]
+        distances = dict(results)
+
+        # The matches are ranked once, full rows are loaded for the requested page only. Pages are
+        # keyed on the distance, or on the search rank without a location.
+        ranked = sorted((position if km is None else km, pk) for position, (pk, km) in enumerate(results))
+        page_ids, next_cursor = paginate_ranked(ranked, request.GET.get('cursor'))
+        vendors_by_id = Vendor.objects.filter(is_approved=True, user__is_active=True).select_related(
+            'user_profile').in_bulk(page_ids)
+        vendors = [vendors_by_id[pk] for pk in page_ids if pk in vendors_by_id]
+        for v in vendors:
+            if distances[v.pk] is not None:
+                v.kms = round(distances[v.pk], 1)
+        set_open_status(vendors)
 
         context = {
             'vendors': vendors,
-            'vendor_count': vendor_count,
+            'vendor_count': len(results),
+            'vendor_count_is_capped': vendor_count_is_capped,
             'source_location': address,
+            'next_page_url': next_page_url(request, next_cursor),
         }
 
         return render(request, 'marketplace/listings.html', context)
@@ -188,11 +178,10 @@ def search(request):
 
 @login_required(login_url='login')
 def checkout(request):
-    cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
-    cart_count = cart_items.count()
-    if cart_count <= 0:
+    cart_items = Cart.objects.filter(user=request.user).select_related('fooditem__vendor').order_by('created_at')
+    if not cart_items:
         return redirect('marketplace')
-    user_profile = UserProfile.objects.get(user=request.user)
+    user_profile = request.user_profile
     default_values = {
         'first_name': request.user.first_name,
         'last_name': request.user.last_name,
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment, Order, OrderedFood
+from .models import Payment, Order, OrderedFood, OrderVendorTotal, VendorDailyRevenue
 
 
 # Register your models here.
@@ -9,11 +9,24 @@ class OrderedFoodInline(admin.TabularInline):
     extra = 0
 
 
+class OrderVendorTotalInline(admin.TabularInline):
+    model = OrderVendorTotal
+    readonly_fields = ('vendor', 'subtotal', 'tax', 'grand_total')
+    extra = 0
+
+
+class VendorDailyRevenueAdmin(admin.ModelAdmin):
+    list_display = ('vendor', 'date', 'order_count', 'gross', 'tax')
+    list_filter = ('date',)
+    readonly_fields = ('vendor', 'date', 'order_count', 'gross', 'tax')
+
+
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('order_number', 'name', 'phone', 'email', 'total', 'payment_method', 'status', 'order_placed_to', 'is_ordered')
-    inlines = (OrderedFoodInline,)
+    inlines = (OrderedFoodInline, OrderVendorTotalInline)
 
 
 admin.site.register(Payment)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderedFood)
+admin.site.register(VendorDailyRevenue, VendorDailyRevenueAdmin)
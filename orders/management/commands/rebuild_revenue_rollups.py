@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from orders.utils import rebuild_vendor_revenue
+from vendor.models import Vendor
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily vendor revenue rollups from the paid orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Vendors rebuilt per transaction.')
+        parser.add_argument('--vendor', type=int, action='append', dest='vendor_ids', help='Only rebuild this vendor id.')
+
+    def handle(self, *args, **options):
+        vendor_ids = Vendor.objects.order_by('pk').values_list('pk', flat=True)
+        if options['vendor_ids']:
+            vendor_ids = vendor_ids.filter(pk__in=options['vendor_ids'])
+
+        # Walk the vendors by primary key so every batch is a small, independent transaction
+        batch_size, last_id, rows = options['batch_size'], 0, 0
+        while True:
+            batch = list(vendor_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            rows += rebuild_vendor_revenue(batch)
+            last_id = batch[-1]
+            self.stdout.write(f'Rebuilt vendors up to id {last_id}.')
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} rollup row(s).'))
@@ -0,0 +1,39 @@
+# Generated by Django 4.1 on 2026-10-18 11:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendor', '0001_initial'),
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderVendorTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('tax', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('grand_total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendor_totals', to='orders.order')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_totals', to='vendor.vendor')),
+            ],
+            options={
+                'unique_together': {('order', 'vendor')},
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderVendorTax',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tax_type', models.CharField(max_length=20)),
+                ('tax_percentage', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('tax_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('vendor_total', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='taxes', to='orders.ordervendortotal')),
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.1 on 2026-10-18 11:24
+
+import json
+from decimal import Decimal
+
+from django.db import migrations
+
+
+def load_json(value):
+    # Old orders stored json.dumps() output inside the JSONField
+    if isinstance(value, str):
+        return json.loads(value, parse_float=Decimal)
+    return value
+
+
+def backfill_order_vendor_totals(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderVendorTotal = apps.get_model('orders', 'OrderVendorTotal')
+    OrderVendorTax = apps.get_model('orders', 'OrderVendorTax')
+    Vendor = apps.get_model('vendor', 'Vendor')
+    vendor_ids = set(Vendor.objects.values_list('id', flat=True))
+
+    for order in Order.objects.filter(vendor_totals__isnull=True).iterator(chunk_size=500):
+        if order.tax_data is not None:
+            tax_data = load_json(order.tax_data)
+            order.tax_data = {tax_type: {percentage: str(amount) for percentage, amount in val.items()}
+                              for tax_type, val in tax_data.items()}
+            order.save(update_fields=['tax_data'])
+
+        for vendor_id, data in (load_json(order.total_data) or {}).items():
+            if int(vendor_id) not in vendor_ids:
+                continue
+            subtotal = Decimal(0)
+            taxes = []
+            for key, val in data.items():
+                subtotal += Decimal(key)
+                for tax_type, percentages in json.loads(val.replace("'", '"')).items():
+                    for percentage, amount in percentages.items():
+                        taxes.append((tax_type, Decimal(percentage), Decimal(str(amount))))
+            tax = sum((amount for _, _, amount in taxes), Decimal(0))
+            vendor_total = OrderVendorTotal.objects.create(order=order, vendor_id=int(vendor_id), subtotal=subtotal,
+                                                           tax=tax, grand_total=subtotal + tax)
+            OrderVendorTax.objects.bulk_create([
+                OrderVendorTax(vendor_total=vendor_total, tax_type=tax_type, tax_percentage=percentage,
+                               tax_amount=amount)
+                for tax_type, percentage, amount in taxes
+            ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendor', '0001_initial'),
+        ('orders', '0002_ordervendortotal_ordervendortax'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_vendor_totals, migrations.RunPython.noop),
+    ]
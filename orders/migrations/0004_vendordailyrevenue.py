@@ -0,0 +1,29 @@
+# Generated by Django 4.1 on 2026-10-18 12:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendor', '0001_initial'),
+        ('orders', '0003_backfill_order_vendor_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorDailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('gross', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tax', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='vendor.vendor')),
+            ],
+            options={
+                'unique_together': {('vendor', 'date')},
+            },
+        ),
+    ]
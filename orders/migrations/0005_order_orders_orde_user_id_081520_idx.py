@@ -0,0 +1,19 @@
+# Generated by Django 4.1 on 2026-10-18 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0004_vendordailyrevenue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'is_ordered', 'created_at'], name='orders_orde_user_id_081520_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1 on 2026-10-18 16:45
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def fill_missing_order_numbers(apps, schema_editor):
+    # order_number becomes unique: blank and repeated numbers (all but the first order) get the order id,
+    # which is far shorter than any generated number
+    Order = apps.get_model('orders', 'Order')
+    repeated = (Order.objects.values('order_number').annotate(orders=Count('id')).filter(orders__gt=1)
+                .values_list('order_number', flat=True))
+    for order_number in list(repeated):
+        first_id = Order.objects.filter(order_number=order_number).order_by('id').values_list('id', flat=True)[0]
+        for order in Order.objects.filter(order_number=order_number).exclude(id=first_id):
+            order.order_number = str(order.id)
+            order.save(update_fields=['order_number'])
+    for order in Order.objects.filter(order_number=''):
+        order.order_number = str(order.id)
+        order.save(update_fields=['order_number'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_orders_orde_user_id_081520_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_missing_order_numbers, migrations.RunPython.noop),
+    ]
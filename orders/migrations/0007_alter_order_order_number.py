@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_fill_missing_order_numbers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='order_number',
+            field=models.CharField(max_length=20, unique=True),
+        ),
+    ]
@@ -1,5 +1,3 @@
-import json
-
 from django.db import models
 from accounts.models import User
 from menu.models import FoodItem
@@ -7,8 +5,6 @@ from menu.models import FoodItem
 # Create your models here.
 from vendor.models import Vendor
 
-request_object = ''
-
 
 class Payment(models.Model):
     PAYMENT_METHOD = (
@@ -36,7 +32,7 @@ class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, blank=True, null=True)
     vendor = models.ManyToManyField(Vendor, blank=True)
-    order_number = models.CharField(max_length=20)
+    order_number = models.CharField(max_length=20, unique=True)
     first_name = models.CharField(max_length=50)
     last_name = models.CharField(max_length=50)
     phone = models.CharField(max_length=15, blank=True)
@@ -49,6 +45,7 @@ class Order(models.Model):
     total = models.FloatField()
     tax_data = models.JSONField(blank=True, help_text="Data format: {'tax_type': {'tax_percentage': 'tax_amount'}}",
                                 null=True)
+    # Legacy per-vendor totals of old orders; new orders store them in OrderVendorTotal
     total_data = models.JSONField(blank=True, null=True)
     total_tax = models.FloatField()
     payment_method = models.CharField(max_length=25)
@@ -57,6 +54,12 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Customer order history pages through (created_at, id), newest first
+            models.Index(fields=['user', 'is_ordered', 'created_at']),
+        ]
+
     @property
     def name(self):
         return f'{self.first_name} {self.last_name}'
@@ -64,37 +67,60 @@ class Order(models.Model):
     def order_placed_to(self):
         return ", ".join([str(i) for i in self.vendor.all()])
 
-    def get_total_by_vendor(self):
-        vendor = Vendor.objects.get(user=request_object.user)
-        subtotal = 0
-        tax = 0
-        tax_dict = {}
-        if self.total_data:
-            total_data = json.loads(self.total_data)
-            data = total_data.get(str(vendor.id))
-
-            for key, val in data.items():
-                subtotal += float(key)
-                val = val.replace("'", '"')
-                val = json.loads(val)
-                tax_dict.update(val)
-
-                # calculate the tax
-                for i in val:
-                    for j in val[i]:
-                        tax += float(val[i][j])
-        grand_total = float(subtotal) + float(tax)
-        context = {
-            'subtotal': subtotal,
-            'tax_dict': tax_dict,
-            'grand_total': grand_total,
-        }
-        return context
+    def get_total_by_vendor(self, vendor):
+        """This order's OrderVendorTotal for vendor."""
+        return self.vendor_totals.prefetch_related('taxes').get(vendor=vendor)
 
     def __str__(self):
         return self.order_number
 
 
+class OrderVendorTotal(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='vendor_totals')
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='order_totals')
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    tax = models.DecimalField(max_digits=12, decimal_places=2)
+    grand_total = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        unique_together = ('order', 'vendor')
+
+    @property
+    def tax_dict(self):
+        tax_dict = {}
+        for tax in self.taxes.all():
+            tax_dict.setdefault(tax.tax_type, {})[str(tax.tax_percentage)] = tax.tax_amount
+        return tax_dict
+
+    def __str__(self):
+        return f'{self.order} - {self.vendor}'
+
+
+class OrderVendorTax(models.Model):
+    vendor_total = models.ForeignKey(OrderVendorTotal, on_delete=models.CASCADE, related_name='taxes')
+    tax_type = models.CharField(max_length=20)
+    tax_percentage = models.DecimalField(decimal_places=2, max_digits=4)
+    tax_amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return self.tax_type
+
+
+class VendorDailyRevenue(models.Model):
+    # Rollup of the vendor's paid orders per local day, kept up to date by the payments view
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name='daily_revenue')
+    date = models.DateField()
+    order_count = models.PositiveIntegerField(default=0)
+    gross = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tax = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('vendor', 'date')
+
+    def __str__(self):
+        return f'{self.vendor} - {self.date}'
+
+
 class OrderedFood(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, blank=True, null=True)
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from orders.models import Order
+from orders.utils import invalidate_customer_order_count
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_customer_order_count_on_change(sender, instance, **kwargs):
+    # After the commit, so a count taken before it is never cached under the new version
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_customer_order_count(user_id))
@@ -1,3 +1,307 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
 # Create your tests here.
+from accounts.models import OutgoingEmail, User
+from foodOnline.testing import create_fooditem, create_user, create_vendor
+from marketplace.models import Cart, Tax
+from marketplace.utils import get_tax_rules, invalidate_cart_totals
+from orders.models import Order, OrderVendorTotal, VendorDailyRevenue
+from orders.utils import (calculate_order_totals, customer_order_count, order_total_by_vendor, record_vendor_revenue,
+                          vendor_revenue)
+
+ORDER_FORM = {
+    'first_name': 'Customer', 'last_name': 'One', 'phone': '0800000000', 'email': 'customer@example.com',
+    'address': '1 Marina', 'country': 'Nigeria', 'state': 'Lagos', 'city': 'Lagos', 'pin_code': '100001',
+    'payment_method': 'Paystack',
+}
+
+
+class PlaceOrderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Tax.objects.create(tax_type='VAT', tax_percentage=Decimal('10.00'))
+        self.customer = create_user('customer', User.CUSTOMER)
+        self.client.force_login(self.customer)
+        self.vendors = [create_vendor(f'vendor{i}') for i in range(5)]
+        self.fooditems = [create_fooditem(vendor, 'rice', '10.00') for vendor in self.vendors]
+        get_tax_rules()
+
+    def fill_cart(self, fooditems):
+        Cart.objects.filter(user=self.customer).delete()
+        for fooditem in fooditems:
+            Cart.objects.create(user=self.customer, fooditem=fooditem, quantity=2)
+        invalidate_cart_totals(self.customer.pk)
+
+    def place_order(self):
+        response = self.client.post(reverse('place_order'), ORDER_FORM)
+        self.assertEqual(response.status_code, 200)
+
+    def test_order_totals_are_grouped_by_vendor(self):
+        self.fill_cart(self.fooditems[:2])
+        cart_items = list(Cart.objects.filter(user=self.customer).select_related('fooditem__vendor'))
+        with self.assertNumQueries(0):
+            totals = calculate_order_totals(cart_items)
+        self.assertEqual(totals['subtotal'], Decimal('40.00'))
+        self.assertEqual(totals['tax'], Decimal('4.00'))
+        self.assertEqual(totals['grand_total'], Decimal('44.00'))
+        self.assertEqual(sorted(totals['vendor_ids']), sorted(v.id for v in self.vendors[:2]))
+
+    def test_place_order_query_count_does_not_grow_with_cart(self):
+        # Session, user, cart items, the order insert with its savepoints (4), the order
+        # vendors, the vendor totals and their taxes, the outer savepoint (2) and the
+        # navbar cart count
+        for fooditems in (self.fooditems[:1], self.fooditems):
+            self.fill_cart(fooditems)
+            with self.assertNumQueries(12):
+                self.place_order()
+
+        order = Order.objects.latest('id')
+        self.assertEqual(order.vendor.count(), 5)
+        self.assertAlmostEqual(order.total, 110.0)
+        self.assertEqual(order.tax_data, {'VAT': {'10.00': '10.00'}})
+
+    def test_order_number_is_assigned_before_the_insert(self):
+        self.fill_cart(self.fooditems[:1])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('place_order'), ORDER_FORM)
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE "orders_order"')])
+        order = Order.objects.latest('id')
+        self.assertRegex(order.order_number, r'^\d{20}$')
+
+    def test_order_number_collision_draws_a_new_number(self):
+        self.fill_cart(self.fooditems[:1])
+        self.client.post(reverse('place_order'), ORDER_FORM)
+        taken = Order.objects.get().order_number
+        with mock.patch('orders.utils.generate_order_number', side_effect=[taken, '20261018120000000001']):
+            self.client.post(reverse('place_order'), ORDER_FORM)
+        self.assertEqual(Order.objects.latest('id').order_number, '20261018120000000001')
+
+    def test_vendor_totals_are_stored_in_columns(self):
+        self.fill_cart(self.fooditems[:2])
+        self.place_order()
+        order = Order.objects.latest('id')
+        vendor_total = order_total_by_vendor(order, self.vendors[1].id)
+        self.assertEqual(vendor_total.subtotal, Decimal('20.00'))
+        self.assertEqual(vendor_total.tax, Decimal('2.00'))
+        self.assertEqual(vendor_total.grand_total, Decimal('22.00'))
+        self.assertEqual(vendor_total.tax_dict, {'VAT': {'10.00': Decimal('2.00')}})
+
+
+class PaymentsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Tax.objects.create(tax_type='VAT', tax_percentage=Decimal('10.00'))
+        self.customer = create_user('customer', User.CUSTOMER)
+        self.client.force_login(self.customer)
+        vendor = create_vendor('vendor')
+        self.fooditems = [create_fooditem(vendor, f'dish{i}', '5.00') for i in range(4)]
+
+    def pay(self, fooditems):
+        Cart.objects.filter(user=self.customer).delete()
+        for fooditem in fooditems:
+            Cart.objects.create(user=self.customer, fooditem=fooditem, quantity=1)
+        invalidate_cart_totals(self.customer.pk)
+        self.client.post(reverse('place_order'), ORDER_FORM)
+        order = Order.objects.latest('id')
+        data = {'order_number': order.order_number, 'transaction_id': f'T{order.id}',
+                'payment_method': 'Paystack', 'status': 'success'}
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('payments'), data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return order, len(queries)
+
+    def test_ordered_food_is_bulk_created(self):
+        order, single_item_queries = self.pay(self.fooditems[:1])
+        order, many_items_queries = self.pay(self.fooditems)
+        self.assertEqual(single_item_queries, many_items_queries)
+        order.refresh_from_db()
+        self.assertTrue(order.is_ordered)
+        self.assertEqual(order.orderedfood_set.count(), 4)
+        rollup = VendorDailyRevenue.objects.get()
+        self.assertEqual(rollup.order_count, 2)
+        self.assertEqual(rollup.gross, Decimal('27.50'))
+
+    def test_vendor_notifications_do_not_add_queries_per_vendor(self):
+        other_vendors = [create_vendor(f'other{i}') for i in range(3)]
+        multi_vendor_items = [self.fooditems[0]] + [create_fooditem(v, 'soup', '7.00') for v in other_vendors]
+        order, single_vendor_queries = self.pay(self.fooditems[:1])
+        OutgoingEmail.objects.all().delete()
+        order, multi_vendor_queries = self.pay(multi_vendor_items)
+        self.assertEqual(single_vendor_queries, multi_vendor_queries)
+        # One confirmation for the customer plus one message per vendor
+        self.assertEqual(OutgoingEmail.objects.count(), 5)
+        self.assertEqual(OutgoingEmail.objects.filter(subject='You have received a new order.').count(), 4)
+
+
+class CustomerOrdersTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = create_user('customer', User.CUSTOMER)
+        self.client.force_login(self.customer)
+
+    def create_order(self, status='New', days_ago=0):
+        order = Order.objects.create(user=self.customer, first_name='Customer', last_name='One', phone='0800',
+                                     email='customer@example.com', address='1 Marina', total=10.0,
+                                     payment_method='Paystack', order_number=f'{Order.objects.count() + 1}',
+                                     total_tax=0, is_ordered=True, status=status)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def test_order_history_is_filtered_and_paged_newest_first(self):
+        orders = [self.create_order(status='Cancelled' if days_ago == 3 else 'New', days_ago=days_ago)
+                  for days_ago in range(25, 0, -1)]
+
+        response = self.client.get(reverse('my_orders'))
+        self.assertEqual(response.context['orders'], orders[::-1][:20])
+        response = self.client.get(reverse('my_orders') + response.context['next_page_url'])
+        self.assertEqual(response.context['orders'], orders[::-1][20:])
+        self.assertIsNone(response.context['next_page_url'])
+
+        response = self.client.get(reverse('my_orders'), {'status': 'Cancelled'})
+        self.assertEqual(response.context['orders'], [orders[-3]])
+        since = (timezone.localdate() - timedelta(days=2)).isoformat()
+        response = self.client.get(reverse('my_orders'), {'from': since, 'to': 'not a date'})
+        self.assertEqual(response.context['orders'], orders[:-3:-1])
+
+    def test_order_count_is_cached_until_an_order_changes(self):
+        self.create_order()
+        self.assertEqual(customer_order_count(self.customer), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(customer_order_count(self.customer), 1)
+
+        order = self.create_order()
+        Order.objects.filter(pk=order.pk).update(is_ordered=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('payments'), {'order_number': order.order_number, 'transaction_id': 'T1',
+                                                   'payment_method': 'Paystack', 'status': 'success'},
+                             HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(customer_order_count(self.customer), 2)
+        response = self.client.get(reverse('customer_dashboard'))
+        self.assertEqual(response.context['orders_count'], 2)
+
+        # Changed outside the payment flow, e.g. in the admin
+        order.is_ordered = False
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertEqual(customer_order_count(self.customer), 1)
+
+
+class VendorRevenueTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.vendor = create_vendor('vendor')
+        self.client.force_login(self.vendor.user)
+        self.customer = create_user('customer', User.CUSTOMER)
+
+    def create_orders(self, count, grand_total='10.00', is_ordered=True):
+        for i in range(count):
+            order = Order.objects.create(user=self.customer, first_name='Customer', last_name='One', phone='0800',
+                                         email='customer@example.com', address='1 Marina', total=float(grand_total),
+                                         payment_method='Paystack', order_number=f'{Order.objects.count()}',
+                                         total_tax=0, is_ordered=is_ordered)
+            order.vendor.add(self.vendor)
+            vendor_total = OrderVendorTotal.objects.create(order=order, vendor=self.vendor,
+                                                           subtotal=Decimal(grand_total), tax=0,
+                                                           grand_total=Decimal(grand_total))
+            if is_ordered:
+                record_vendor_revenue(order, {self.vendor.id: vendor_total})
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('vendorDashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_revenue_is_read_from_daily_rollups(self):
+        self.create_orders(2)
+        self.create_orders(1, grand_total='99.00', is_ordered=False)
+        self.assertEqual(VendorDailyRevenue.objects.get(vendor=self.vendor).order_count, 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(vendor_revenue(self.vendor), Decimal('20.00'))
+
+    def test_dashboard_query_count_does_not_grow_with_orders(self):
+        self.create_orders(1)
+        response, few_orders_queries = self.dashboard_queries()
+        self.create_orders(20)
+        response, many_orders_queries = self.dashboard_queries()
+        self.assertEqual(few_orders_queries, many_orders_queries)
+        self.assertEqual(response.context['orders_count'], 21)
+        self.assertEqual(response.context['total_revenue'], Decimal('210.00'))
+        self.assertEqual(response.context['current_month_revenue'], Decimal('210.00'))
+
+    def test_order_list_query_count_does_not_grow_with_orders(self):
+        def order_list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('vendor_my_orders'))
+            self.assertEqual(response.status_code, 200)
+            return response, len(queries)
+
+        self.create_orders(1)
+        response, few_orders_queries = order_list_queries()
+        self.create_orders(20, grand_total='12.50')
+        response, many_orders_queries = order_list_queries()
+        self.assertEqual(few_orders_queries, many_orders_queries)
+        orders = list(response.context['orders'])
+        self.assertEqual(len(orders), 21)
+        self.assertEqual(orders[0].vendor_grand_total, Decimal('12.50'))
+        self.assertEqual(orders[-1].vendor_grand_total, Decimal('10.00'))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.create_orders(3, grand_total='7.50')
+        incremental = list(VendorDailyRevenue.objects.values('date', 'order_count', 'gross', 'tax'))
+        VendorDailyRevenue.objects.update(order_count=0, gross=0)
+        call_command('rebuild_revenue_rollups', stdout=StringIO())
+        self.assertEqual(list(VendorDailyRevenue.objects.values('date', 'order_count', 'gross', 'tax')), incremental)
+
+
+class VendorTotalsConcurrencyTest(TransactionTestCase):
+    def setUp(self):
+        customer = create_user('customer', User.CUSTOMER)
+        self.vendors = [create_vendor('vendor0'), create_vendor('vendor1')]
+        self.order = Order.objects.create(user=customer, first_name='Customer', last_name='One', phone='0800',
+                                          email='customer@example.com', address='1 Marina', total=33.0,
+                                          payment_method='Paystack', order_number='1001', total_tax=0,
+                                          is_ordered=True)
+        self.order.vendor.add(*self.vendors)
+        for vendor, amount in zip(self.vendors, ('11.00', '22.00')):
+            OrderVendorTotal.objects.create(order=self.order, vendor=vendor, subtotal=Decimal(amount), tax=0,
+                                            grand_total=Decimal(amount))
+
+    def test_concurrent_vendor_requests_see_their_own_totals(self):
+        requests_per_thread = 10
+        barrier = threading.Barrier(len(self.vendors))
+        results = []
+
+        def list_orders(vendor, own_total, other_total):
+            client = Client()
+            client.force_login(vendor.user)
+            barrier.wait()
+            try:
+                for _ in range(requests_per_thread):
+                    content = client.get(reverse('vendor_my_orders')).content.decode()
+                    results.append(own_total in content and other_total not in content)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=list_orders, args=[self.vendors[0], '$11.00', '$22.00']),
+                   threading.Thread(target=list_orders, args=[self.vendors[1], '$22.00', '$11.00'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [True] * 2 * requests_per_thread)
+
+    def test_vendor_can_be_passed_explicitly(self):
+        self.assertEqual(self.order.get_total_by_vendor(self.vendors[1]).grand_total, Decimal('22.00'))
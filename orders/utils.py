@@ -1,34 +1,222 @@
 import datetime
-import simplejson as json
+import secrets
+from decimal import Decimal
 
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, FilteredRelation, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
 
-def generate_order_number(pk):
-    current_datetime = datetime.datetime.now().strftime('%Y%m%d%H%M%S')  # 2022121251710 + pk
-    order_number = current_datetime + str(pk)
-    return order_number
+from foodOnline.cache_versions import bump_cache_version, get_cache_version
+from marketplace.utils import build_cart_summary
+from orders.models import Order, OrderVendorTax, OrderVendorTotal, VendorDailyRevenue
+
+CUSTOMER_ORDER_COUNT_TIMEOUT = 10 * 60
+ORDER_NUMBER_ATTEMPTS = 5
+
+
+def generate_order_number():
+    # Time ordered, and known before the INSERT: 14 digit timestamp + 6 random digits
+    current_datetime = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+    return current_datetime + f'{secrets.randbelow(10 ** 6):06d}'
+
+
+def insert_order(order):
+    """Save a new order under a fresh order number, drawing another one on the rare collision."""
+    for attempt in range(ORDER_NUMBER_ATTEMPTS):
+        order.order_number = generate_order_number()
+        try:
+            with transaction.atomic():
+                order.save(force_insert=True)
+            return order
+        except IntegrityError:
+            if attempt == ORDER_NUMBER_ATTEMPTS - 1:
+                raise
+
+
+def calculate_order_totals(cart_items):
+    # Single pass over cart items loaded with select_related('fooditem'); taxes come from the cached tax table
+    vendor_subtotals = {}
+    vendor_counts = {}
+    for item in cart_items:
+        vendor_id = item.fooditem.vendor_id
+        vendor_subtotals[vendor_id] = vendor_subtotals.get(vendor_id, 0) + (item.fooditem.price * item.quantity)
+        vendor_counts[vendor_id] = vendor_counts.get(vendor_id, 0) + item.quantity
+
+    totals = build_cart_summary(sum(vendor_subtotals.values()), sum(vendor_counts.values()))
+    totals.update({
+        'vendor_ids': list(vendor_subtotals),
+        'vendor_totals': {vendor_id: build_cart_summary(subtotal, vendor_counts[vendor_id])
+                          for vendor_id, subtotal in vendor_subtotals.items()},
+    })
+    return totals
+
+
+def serialize_tax_dict(tax_dict):
+    return {tax_type: {percentage: str(amount) for percentage, amount in val.items()}
+            for tax_type, val in tax_dict.items()}
+
+
+def save_order_vendor_totals(order, vendor_totals):
+    order_vendor_totals = OrderVendorTotal.objects.bulk_create([
+        OrderVendorTotal(order=order, vendor_id=vendor_id, subtotal=totals['subtotal'], tax=totals['tax'],
+                         grand_total=totals['grand_total'])
+        for vendor_id, totals in vendor_totals.items()
+    ])
+    OrderVendorTax.objects.bulk_create([
+        OrderVendorTax(vendor_total=vendor_total, tax_type=tax_type, tax_percentage=Decimal(percentage),
+                       tax_amount=amount)
+        for vendor_total in order_vendor_totals
+        for tax_type, val in vendor_totals[vendor_total.vendor_id]['tax_dict'].items()
+        for percentage, amount in val.items()
+    ])
+    return order_vendor_totals
+
+
+def order_totals_by_vendor(order):
+    return {vendor_total.vendor_id: vendor_total for vendor_total in order.vendor_totals.prefetch_related('taxes')}
 
 
 def order_total_by_vendor(order, vendor_id):
-    total_data = json.loads(order.total_data)
-    data = total_data.get(str(vendor_id))
-    subtotal = 0
-    tax = 0
-    tax_dict = {}
-
-    for key, val in data.items():
-        subtotal += float(key)
-        val = val.replace("'", '"')
-        val = json.loads(val)
-        tax_dict.update(val)
-
-        # calculate the tax
-        for i in val:
-            for j in val[i]:
-                tax += float(val[i][j])
-    grand_total = float(subtotal) + float(tax)
-    context = {
-        'subtotal': subtotal,
-        'tax_dict': tax_dict,
-        'grand_total': grand_total,
-    }
-    return context
+    return order.vendor_totals.prefetch_related('taxes').get(vendor_id=vendor_id)
+
+
+def vendor_orders(vendor):
+    """The vendor's placed orders, newest first, annotated with this vendor's share of each order.
+
+    vendor_subtotal, vendor_tax and vendor_grand_total come from the vendor's OrderVendorTotal row,
+    joined in the same query, and the vendors of each order are prefetched.
+    """
+    return (
+        Order.objects.filter(vendor=vendor, is_ordered=True)
+        .annotate(this_vendor_total=FilteredRelation('vendor_totals', condition=Q(vendor_totals__vendor=vendor)))
+        .annotate(
+            vendor_subtotal=F('this_vendor_total__subtotal'),
+            vendor_tax=F('this_vendor_total__tax'),
+            vendor_grand_total=F('this_vendor_total__grand_total'),
+        )
+        .prefetch_related('vendor')
+        .order_by('-created_at', '-id')
+    )
+
+
+def record_vendor_revenue(order, vendor_totals):
+    """Add a newly paid order to the daily rollups of its vendors, with two queries whatever their number."""
+    if not vendor_totals:
+        return
+    date = timezone.localdate(order.created_at)
+    VendorDailyRevenue.objects.bulk_create(
+        [VendorDailyRevenue(vendor_id=vendor_id, date=date) for vendor_id in vendor_totals], ignore_conflicts=True)
+
+    def per_vendor(field):
+        return Case(*[When(vendor_id=vendor_id, then=Value(getattr(totals, field)))
+                      for vendor_id, totals in vendor_totals.items()],
+                    default=Value(0), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+    VendorDailyRevenue.objects.filter(vendor_id__in=vendor_totals, date=date).update(
+        order_count=F('order_count') + 1,
+        gross=F('gross') + per_vendor('grand_total'),
+        tax=F('tax') + per_vendor('tax'),
+    )
+
+
+def vendor_revenue_totals(vendor, start=None, end=None):
+    """Order count, gross and tax of the vendor's paid orders between the dates [start, end), from the rollups."""
+    rollups = VendorDailyRevenue.objects.filter(vendor=vendor)
+    if start is not None:
+        rollups = rollups.filter(date__gte=start)
+    if end is not None:
+        rollups = rollups.filter(date__lt=end)
+    totals = rollups.aggregate(order_count=Sum('order_count'), gross=Sum('gross'), tax=Sum('tax'))
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def vendor_revenue(vendor, start=None, end=None):
+    return vendor_revenue_totals(vendor, start, end)['gross']
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def customer_orders(user, status=None, date_from=None, date_to=None):
+    """The customer's placed orders, optionally of one status and placed between two dates (inclusive)."""
+    # Date bounds are compared on created_at itself so the (user, is_ordered, created_at) index applies
+    orders = Order.objects.filter(user=user, is_ordered=True)
+    if status:
+        orders = orders.filter(status=status)
+    if date_from is not None:
+        orders = orders.filter(created_at__gte=_start_of_day(date_from))
+    if date_to is not None:
+        orders = orders.filter(created_at__lt=_start_of_day(date_to + datetime.timedelta(days=1)))
+    return orders
+
+
+def _customer_order_count_version_key(user_id):
+    return f'customer-order-count-version:{user_id}'
+
+
+def customer_order_count(user):
+    """Number of orders the customer has placed, cached until one of their orders changes."""
+    version_key = _customer_order_count_version_key(user.pk)
+    # The version is read before counting: an order committed meanwhile bumps it, so the
+    # possibly stale count below is stored under a version that is never read again
+    version = get_cache_version(version_key)
+    key = f'customer-order-count:{user.pk}:{version}'
+    count = cache.get(key)
+    if count is None:
+        count = customer_orders(user).count()
+        cache.set(key, count, CUSTOMER_ORDER_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_customer_order_count(user_id):
+    bump_cache_version(_customer_order_count_version_key(user_id))
+
+
+def rebuild_vendor_revenue(vendor_ids, chunk_size=2000):
+    """Recompute the daily rollups of the given vendors from their paid orders."""
+    daily_totals = (
+        OrderVendorTotal.objects.filter(vendor_id__in=vendor_ids, order__is_ordered=True)
+        .annotate(date=TruncDate('order__created_at'))
+        .values('vendor_id', 'date')
+        .annotate(order_count=Count('id'), gross=Sum('grand_total'), tax=Sum('tax'))
+        .order_by()
+    )
+    created = 0
+    with transaction.atomic():
+        VendorDailyRevenue.objects.filter(vendor_id__in=vendor_ids).delete()
+        rollups = []
+        for row in daily_totals.iterator(chunk_size=chunk_size):
+            rollups.append(VendorDailyRevenue(**row))
+            if len(rollups) == chunk_size:
+                created += len(VendorDailyRevenue.objects.bulk_create(rollups))
+                rollups = []
+        created += len(VendorDailyRevenue.objects.bulk_create(rollups))
+    return created
+
+
+def build_vendor_notifications(order, ordered_food, domain, vendor_totals):
+    """One 'new order' email per vendor, from ordered food loaded with select_related('fooditem__vendor__user')
+    and the order's {vendor_id: OrderVendorTotal}."""
+    ordered_food_by_vendor = {}
+    for item in ordered_food:
+        ordered_food_by_vendor.setdefault(item.fooditem.vendor, []).append(item)
+
+    mail_subject = 'You have received a new order.'
+    mail_template = 'orders/new_order_received.html'
+    notifications = []
+    for vendor, ordered_food_to_vendor in ordered_food_by_vendor.items():
+        totals = vendor_totals[vendor.id]
+        context = {
+            'order': order,
+            'to_email': vendor.user.email,
+            'ordered_food_to_vendor': ordered_food_to_vendor,
+            'domain': domain,
+            'vendor_subtotal': totals.subtotal,
+            'tax_data': totals.tax_dict,
+            'vendor_grand_total': totals.grand_total,
+        }
+        notifications.append((mail_subject, mail_template, context))
+    return notifications
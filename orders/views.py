@@ -1,62 +1,32 @@
-import simplejson as json
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.sites.shortcuts import get_current_site
+from django.db import transaction
 from django.http import HttpResponse, JsonResponse
 
 from django.shortcuts import render, redirect
 
 # Create your views here.
-from accounts.utils import send_notification
-from marketplace.context_processors import get_cart_amounts
-from marketplace.models import Cart, Tax
-from menu.models import FoodItem
+from accounts.utils import send_notifications
+from marketplace.models import Cart
 from orders.forms import OrderForm
 from orders.models import Order, Payment, OrderedFood
-from orders.utils import generate_order_number, order_total_by_vendor
+from orders.utils import (build_vendor_notifications, calculate_order_totals, insert_order, order_totals_by_vendor,
+                          record_vendor_revenue, save_order_vendor_totals, serialize_tax_dict)
 
 
 @login_required(login_url='login')
 def place_order(request):
-    cart_items = Cart.objects.filter(user=request.user).order_by('created_at')
-    cart_count = cart_items.count()
-    if cart_count <= 0:
+    cart_items = Cart.objects.filter(user=request.user).select_related('fooditem__vendor').order_by('created_at')
+    if not cart_items:
         return redirect('marketplace')
-    vendor_ids = []
-    for i in cart_items:
-        if i.fooditem.vendor.id not in vendor_ids:
-            vendor_ids.append(i.fooditem.vendor.id)
-
-    subtotal = 0
-    get_tax = Tax.objects.filter(is_active=True)
-    total_data = {}
-    k = {}
-    for i in cart_items:
-        fooditem = FoodItem.objects.get(pk=i.fooditem.id, vendor_id__in=vendor_ids)
-        v_id = fooditem.vendor.id
-        if v_id in k:
-            subtotal = k[v_id]
-            subtotal += (fooditem.price * i.quantity)
-            k[v_id] = subtotal
-        else:
-            subtotal = (fooditem.price * i.quantity)
-            k[v_id] = subtotal
-
-        # Calculate tax data
-        tax_dict = {}
-        for i in get_tax:
-            tax_type = i.tax_type
-            tax_percentage = i.tax_percentage
-            tax_amount = round((tax_percentage * subtotal)/100, 2)
-            tax_dict.update({tax_type: {str(tax_percentage): str(tax_amount)}})
-        # Construct total data
-        total_data.update({fooditem.vendor.id: {str(subtotal): str(tax_dict)}})
 
-
-    subtotal = get_cart_amounts(request)['subtotal']
-    total_tax = get_cart_amounts(request)['tax']
-    grand_total = get_cart_amounts(request)['grand_total']
-    tax_data = get_cart_amounts(request)['tax_dict']
+    order_totals = calculate_order_totals(cart_items)
+    vendor_ids = order_totals['vendor_ids']
+    subtotal = order_totals['subtotal']
+    total_tax = order_totals['tax']
+    grand_total = order_totals['grand_total']
+    tax_data = order_totals['tax_dict']
 
     if request.method == 'POST':
         form = OrderForm(request.POST)
@@ -73,18 +43,20 @@ def place_order(request):
             order.pin_code = form.cleaned_data['pin_code']
             order.user = request.user
             order.total = grand_total
-            order.tax_data = json.dumps(tax_data)
-            order.total_data = json.dumps(total_data)
+            order.tax_data = serialize_tax_dict(tax_data)
             order.total_tax = total_tax
             order.payment_method = request.POST['payment_method']
-            order.save()
-            order.order_number = generate_order_number(order.id)
-            order.vendor.add(*vendor_ids)
-            order.save()
+            with transaction.atomic():
+                insert_order(order)
+                order.vendor.add(*vendor_ids)
+                save_order_vendor_totals(order, order_totals['vendor_totals'])
             paystack_public_key = settings.PAYSTACK_PUBLIC_KEY
             context = {
                 'order': order,
                 'cart_items': cart_items,
+                'subtotal': subtotal,
+                'tax_dict': tax_data,
+                'grand_total': grand_total,
                 'paystack_public_key': paystack_public_key,
             }
             return render(request, 'orders/place_order.html', context)
@@ -103,69 +75,57 @@ def payments(request):
         status = request.POST.get('status')
 
         order = Order.objects.get(user=request.user, order_number=order_number)
-        payment = Payment(
-            user=request.user,
-            transaction_id=transaction_id,
-            payment_method=payment_method,
-            amount=order.total,
-            status=status
-        )
-        payment.save()
-
-        order.payment = payment
-        order.is_ordered = True
-        order.save()
-
-        cart_items = Cart.objects.filter(user=request.user)
-        for item in cart_items:
-            ordered_food = OrderedFood()
-            ordered_food.user = request.user
-            ordered_food.payment = payment
-            ordered_food.order = order
-            ordered_food.fooditem = item.fooditem
-            ordered_food.quantity = item.quantity
-            ordered_food.price = item.fooditem.price
-            ordered_food.amount = item.fooditem.price * item.quantity
-            ordered_food.save()
-        # return HttpResponse('Saved ordered food')
+        cart_items = Cart.objects.filter(user=request.user).select_related('fooditem__vendor__user')
+        with transaction.atomic():
+            payment = Payment.objects.create(
+                user=request.user,
+                transaction_id=transaction_id,
+                payment_method=payment_method,
+                amount=order.total,
+                status=status
+            )
+
+            newly_ordered = not order.is_ordered
+            order.payment = payment
+            order.is_ordered = True
+            order.save(update_fields=['payment', 'is_ordered', 'updated_at'])
+
+            ordered_food = OrderedFood.objects.bulk_create([
+                OrderedFood(
+                    user=request.user,
+                    payment=payment,
+                    order=order,
+                    fooditem=item.fooditem,
+                    quantity=item.quantity,
+                    price=item.fooditem.price,
+                    amount=item.fooditem.price * item.quantity,
+                )
+                for item in cart_items
+            ])
+
+            vendor_totals = order_totals_by_vendor(order)
+            if newly_ordered:
+                record_vendor_revenue(order, vendor_totals)
 
         mail_subject = 'Thank you for ordering with us.'
         mail_template = 'orders/order_confirmation_email.html'
-        ordered_food = OrderedFood.objects.filter(order=order)
         customer_subtotal = 0
         for item in ordered_food:
             customer_subtotal += (item.price * item.quantity)
-        tax_data = json.loads(order.tax_data)
+        tax_data = order.tax_data or {}
+        domain = get_current_site(request)
         context = {
             'user': request.user,
             'order': order,
             'to_email': order.email,
             'ordered_food': ordered_food,
-            'domain': get_current_site(request),
+            'domain': domain,
             'customer_subtotal': customer_subtotal,
             'tax_data': tax_data,
         }
-
-        send_notification(mail_subject=mail_subject, mail_template=mail_template, context=context)
-
-        mail_subject = 'You have received a new order.'
-        mail_template = 'orders/new_order_received.html'
-        to_emails = []
-        for i in cart_items:
-            if i.fooditem.vendor.user.email not in to_emails:
-                to_emails.append(i.fooditem.vendor.user.email)
-
-                ordered_food_to_vendor = OrderedFood.objects.filter(order=order, fooditem__vendor=i.fooditem.vendor)
-
-                context = {
-                    'order': order,
-                    'to_email': i.fooditem.vendor.user.email,
-                    'ordered_food_to_vendor': ordered_food_to_vendor,
-                    'vendor_subtotal': order_total_by_vendor(order, i.fooditem.vendor.id)['subtotal'],
-                    'tax_data': order_total_by_vendor(order, i.fooditem.vendor.id)['tax_dict'],
-                    'vendor_grand_total': order_total_by_vendor(order, i.fooditem.vendor.id)['grand_total'],
-                }
-                send_notification(mail_subject=mail_subject, mail_template=mail_template, context=context)
+        notifications = [(mail_subject, mail_template, context)]
+        notifications += build_vendor_notifications(order, ordered_food, domain, vendor_totals)
+        send_notifications(notifications)
 
         # cart_items.delete()
 
@@ -190,7 +150,7 @@ def order_complete(request):
         subtotal = 0
         for item in ordered_food:
             subtotal += (item.price * item.quantity)
-        tax_data = json.loads(order.tax_data)
+        tax_data = order.tax_data or {}
         context = {
             'order': order,
             'ordered_food': ordered_food,